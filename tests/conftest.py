@@ -1,6 +1,8 @@
 import sys
 import os
 
+import pytest
+
 
 root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(root_dir)
@@ -31,4 +33,27 @@ if FILENAME not in project_dir_content:
 pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
+    'yatube.pytest_queries',
 ]
+
+
+@pytest.fixture(autouse=True, scope='session')
+def temporary_cache(django_test_environment):
+    # Не трогать файл кэша сервера разработки
+    from yatube.test_runner import temporary_cache
+    with temporary_cache():
+        yield
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # Кэш хранится в файле и переживает отдельные тесты
+    from django.core.cache import cache
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def inline_images(settings):
+    # Фоновый поток мог бы писать картинки во временный MEDIA_ROOT
+    # после того, как тест его удалил
+    settings.POSTS_IMAGE_WORKERS = 0
@@ -0,0 +1,17 @@
+import pytest
+
+pytestmark = [pytest.mark.django_db]
+
+
+class TestRepeatedQueries:
+
+    def test_feeds_have_no_repeated_queries(self, client, few_posts_with_group, no_repeated_queries):
+        urls = [
+            '/',
+            f'/group/{few_posts_with_group.group.slug}/',
+            f'/{few_posts_with_group.author.username}/',
+        ]
+        for url in urls:
+            with no_repeated_queries():
+                response = client.get(url)
+            assert response.status_code == 200, f'Ошибка {response.status_code} при открытии `{url}`'
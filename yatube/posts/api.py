@@ -0,0 +1,123 @@
+"""
+JSON-представления лент, записей и комментариев только для чтения.
+
+Из базы выбираются только отдаваемые столбцы через values(), а на
+повторный запрос без изменений отвечается 304 по ETag и Last-Modified,
+еще до выборки данных.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.paginator import Paginator
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_GET
+
+from . import versions
+from .models import Comment, Group, Post, Profile
+from .paginators import paginate
+
+User = get_user_model()
+
+POST_FIELDS = ('id', 'text', 'pub_date', 'author__username', 'group__slug',
+               'image', 'thumbnail', 'comment_count')
+COMMENT_FIELDS = ('id', 'text', 'created', 'author__username')
+
+
+def serialize_post(row):
+    return {
+        'id': row['id'],
+        'text': row['text'],
+        'pub_date': row['pub_date'],
+        'author': row['author__username'],
+        'group': row['group__slug'],
+        'image': default_storage.url(row['image']) if row['image'] else None,
+        'thumbnail': row['thumbnail'] or None,
+        'comment_count': row['comment_count'],
+    }
+
+
+def serialize_comment(row):
+    return {
+        'id': row['id'],
+        'text': row['text'],
+        'created': row['created'],
+        'author': row['author__username'],
+    }
+
+
+def page_links(page):
+    if getattr(page.paginator, 'keyset', False):
+        return {
+            'next': f'?cursor={page.next_cursor}' if page.has_next() else None,
+            'previous': (f'?cursor={page.previous_cursor}'
+                         if page.has_previous() else None),
+        }
+    # Без подсчета (POSTS_PAGINATION = 'has_next') числа записей нет
+    links = ({'count': page.paginator.count}
+             if getattr(page.paginator, 'counted', True) else {})
+    links.update({
+        'next': (f'?page={page.next_page_number()}'
+                 if page.has_next() else None),
+        'previous': (f'?page={page.previous_page_number()}'
+                     if page.has_previous() else None),
+    })
+    return links
+
+
+def feed_response(request, post_list, feed, count=None):
+    page = paginate(request, post_list.values(*POST_FIELDS), feed, count)
+    return JsonResponse({
+        **page_links(page),
+        'results': [serialize_post(row) for row in page],
+    })
+
+
+@require_GET
+@versions.conditional(lambda request: [versions.INDEX])
+def index(request):
+    return feed_response(request, Post.objects.all(), 'index')
+
+
+@require_GET
+@versions.conditional(
+    lambda request, slug: [versions.group_name(slug)])
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return feed_response(request, group.posts.all(), f'group:{group.id}')
+
+
+@require_GET
+@versions.conditional(
+    lambda request, username: [versions.author_name(username)])
+def profile(request, username):
+    author = get_object_or_404(User.objects.select_related('profile'),
+                               username=username)
+    return feed_response(request, author.posts.all(), f'author:{author.id}',
+                         Profile.objects.for_user(author).posts_count)
+
+
+@require_GET
+@versions.conditional(
+    lambda request, post_id: [versions.post_name(post_id)])
+def post_detail(request, post_id):
+    row = Post.objects.filter(pk=post_id).values(*POST_FIELDS).first()
+    if row is None:
+        raise Http404('Запись не найдена')
+    return JsonResponse(serialize_post(row))
+
+
+@require_GET
+@versions.conditional(
+    lambda request, post_id: [versions.post_name(post_id)])
+def post_comments(request, post_id):
+    if not Post.objects.filter(pk=post_id).exists():
+        raise Http404('Запись не найдена')
+    comments = Comment.objects.filter(post_id=post_id).values(
+        *COMMENT_FIELDS)
+    page = Paginator(comments, settings.POSTS_PER_PAGE).get_page(
+        request.GET.get('page'))
+    return JsonResponse({
+        **page_links(page),
+        'results': [serialize_comment(row) for row in page],
+    })
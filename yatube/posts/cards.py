@@ -0,0 +1,84 @@
+"""
+Кэш отрисованных карточек записей.
+
+Ключ карточки содержит id и версию записи, поэтому правка, комментарий
+или новая картинка сразу дают новый ключ, а карточки остальных записей
+продолжают браться из кэша. Одна и та же карточка используется во всех
+лентах: на главной, в группе, в профиле и в подписках.
+
+Карточки, которых нет в кэше, отрисовываются за один проход: шаблон
+берется у загрузчика один раз, все карточки рисуются в одном контексте,
+а вместо записей в него попадают готовые словари с уже посчитанными
+адресами, так что шаблону не нужны ни {% url %}, ни обращения к
+связанным объектам.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.template import Context, engines
+from django.urls import reverse
+from django.utils.safestring import mark_safe
+
+TEMPLATE = 'posts/post_item.html'
+
+
+def card_key(post, user):
+    # Автор видит в карточке кнопку редактирования, остальные - нет
+    is_author = int(post.author_id == user.id)
+    return f'post_card:{post.id}:{post.version}:{is_author}'
+
+
+def card_data(post, user, comment_link=True):
+    """
+    Все, что показывает карточка записи, в виде словаря. Запись должна
+    быть выбрана вместе с автором и группой (Post.objects.for_feed).
+    """
+    username = post.author.username
+    post_url = reverse('post', args=(username, post.id))
+    return {
+        'id': post.id,
+        'text': post.text,
+        'pub_date': post.pub_date,
+        'author': username,
+        'author_url': reverse('profile', args=(username,)),
+        'group_title': post.group.title if post.group_id else None,
+        'group_url': (reverse('group_posts', args=(post.group.slug,))
+                      if post.group_id else None),
+        'comment_count': post.comment_count,
+        'comment_url': post_url if comment_link else None,
+        'edit_url': (reverse('post_edit', args=(username, post.id))
+                     if post.author_id == user.id else None),
+        'thumbnail': post.thumbnail,
+        'image_sources': post.image_sources if post.thumbnail else (),
+        'image_url': (post.image.url if post.image and not post.thumbnail
+                      else None),
+    }
+
+
+def render_card_list(cards):
+    """
+    Отрисовывает словари card_data одним шаблоном в одном контексте.
+    """
+    template = engines['django'].engine.get_template(TEMPLATE)
+    context = Context()
+    rendered = []
+    for card in cards:
+        with context.push(card=card):
+            rendered.append(template.render(context))
+    return rendered
+
+
+def render_cards(posts, user):
+    """
+    Собирает ленту из карточек, отрисовывая только отсутствующие в кэше.
+    """
+    keys = [card_key(post, user) for post in posts]
+    cards = cache.get_many(keys)
+    missing = [(post, key) for post, key in zip(posts, keys)
+               if key not in cards]
+    if missing:
+        rendered = dict(zip(
+            (key for _, key in missing),
+            render_card_list(card_data(post, user) for post, _ in missing)))
+        cache.set_many(rendered, settings.POSTS_CARD_CACHE_TIMEOUT)
+        cards.update(rendered)
+    return mark_safe(''.join(cards[key] for key in keys))
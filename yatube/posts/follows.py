@@ -0,0 +1,134 @@
+"""
+Подписки и отписки одним SQL-запросом.
+
+Подписка по имени автора - это один INSERT ... SELECT ... ON CONFLICT DO
+NOTHING с подзапросом к таблице пользователей, отписка - один DELETE с
+таким же подзапросом. Отдельной выборки автора нет, а повторная или
+одновременная подписка упирается в ограничение unique_follow, а не в
+гонку между get и create. Сигналы модели при этом не срабатывают, поэтому
+счетчики, ленты и версии страниц обновляются явно.
+
+ON CONFLICT и RETURNING есть в SQLite только с версии 3.35; на более
+старой библиотеке подписки пишутся через ORM в той же транзакции.
+"""
+import sqlite3
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+
+from .models import Follow
+from .signals import followed, unfollowed
+
+User = get_user_model()
+# Имен в одном запросе: SQLite ограничивает число параметров
+CHUNK_SIZE = 500
+
+
+def _names():
+    quote = connection.ops.quote_name
+    return {
+        'follow': quote(Follow._meta.db_table),
+        'user_column': quote(Follow._meta.get_field('user').column),
+        'author_column': quote(Follow._meta.get_field('author').column),
+        'users': quote(User._meta.db_table),
+        'id': quote(User._meta.pk.column),
+        'username': quote(User._meta.get_field('username').column),
+    }
+
+
+def _supports_returning():
+    return (connection.vendor != 'sqlite'
+            or sqlite3.sqlite_version_info >= (3, 35, 0))
+
+
+def _follow_chunk(user, chunk):
+    if not _supports_returning():
+        authors = set(User.objects.filter(username__in=chunk).exclude(
+            id=user.id).values_list('id', flat=True))
+        authors -= set(Follow.objects.filter(
+            user=user, author__in=authors).values_list('author', flat=True))
+        Follow.objects.bulk_create(
+            [Follow(user=user, author_id=author) for author in authors],
+            ignore_conflicts=True)
+        return list(authors)
+    names = _names()
+    placeholders = ', '.join(['%s'] * len(chunk))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {names["follow"]} '
+            f'({names["user_column"]}, {names["author_column"]}) '
+            f'SELECT %s, {names["id"]} FROM {names["users"]} '
+            f'WHERE {names["username"]} IN ({placeholders}) '
+            f'AND {names["id"]} <> %s '
+            f'ON CONFLICT DO NOTHING '
+            f'RETURNING {names["author_column"]}',
+            [user.id, *chunk, user.id])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _unfollow_chunk(user, chunk):
+    names = _names()
+    placeholders = ', '.join(['%s'] * len(chunk))
+    if not _supports_returning():
+        # QuerySet.delete послал бы post_delete на каждую подписку
+        authors = list(Follow.objects.filter(
+            user=user, author__username__in=chunk).values_list(
+                'author', flat=True))
+        if authors:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {names["follow"]} '
+                    f'WHERE {names["user_column"]} = %s '
+                    f'AND {names["author_column"]} IN '
+                    f'({", ".join(["%s"] * len(authors))})',
+                    [user.id, *authors])
+        return authors
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {names["follow"]} '
+            f'WHERE {names["user_column"]} = %s '
+            f'AND {names["author_column"]} IN ('
+            f'SELECT {names["id"]} FROM {names["users"]} '
+            f'WHERE {names["username"]} IN ({placeholders})) '
+            f'RETURNING {names["author_column"]}',
+            [user.id, *chunk])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _chunks(usernames):
+    usernames = list(dict.fromkeys(usernames))
+    for start in range(0, len(usernames), CHUNK_SIZE):
+        yield usernames[start:start + CHUNK_SIZE]
+
+
+def follow(user, usernames):
+    """
+    Подписывает user на авторов usernames.
+
+    Возвращает id авторов, подписка на которых появилась; уже
+    существующие подписки, подписка на себя и неизвестные имена
+    пропускаются.
+    """
+    author_ids = []
+    for chunk in _chunks(usernames):
+        with transaction.atomic():
+            created = _follow_chunk(user, chunk)
+            if created:
+                followed(user.id, created)
+        author_ids += created
+    return author_ids
+
+
+def unfollow(user, usernames):
+    """
+    Отписывает user от авторов usernames и возвращает id авторов, от
+    которых он действительно отписался.
+    """
+    author_ids = []
+    for chunk in _chunks(usernames):
+        with transaction.atomic():
+            deleted = _unfollow_chunk(user, chunk)
+            if deleted:
+                unfollowed(user.id, deleted)
+        author_ids += deleted
+    return author_ids
@@ -0,0 +1,119 @@
+"""
+Фоновая подготовка миниатюр и адаптивных копий картинок записей.
+
+Картинка обрабатывается в пуле потоков сразу после сохранения записи:
+готовятся миниатюра и копии нескольких ширин в WebP (и AVIF, если его
+поддерживает Pillow). Адреса сохраняются в Post.thumbnail и
+Post.derivatives, поэтому лента при отрисовке только подставляет готовые
+адреса и не обращается ни к PIL, ни к хранилищу sorl-thumbnail.
+"""
+import io
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import F
+from PIL import Image
+from sorl.thumbnail import get_thumbnail
+
+from . import versions
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.POSTS_IMAGE_WORKERS,
+            thread_name_prefix='post-images')
+    return _executor
+
+
+def derivative_formats():
+    """
+    Форматы адаптивных копий, которые умеет сохранять установленный Pillow.
+    """
+    Image.init()
+    return [(name, mime) for name, mime in (('AVIF', 'image/avif'),
+                                            ('WEBP', 'image/webp'))
+            if name in Image.SAVE]
+
+
+def generate_derivatives(image, post_id):
+    """
+    Сохраняет копии картинки нескольких ширин в современных форматах и
+    возвращает описания для тегов <source>.
+    """
+    image.open('rb')
+    try:
+        original = Image.open(image)
+        original.load()
+    finally:
+        image.close()
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA')
+    widths = [width for width in settings.POSTS_IMAGE_WIDTHS
+              if width < original.width] or [original.width]
+    stem = os.path.splitext(os.path.basename(image.name))[0]
+    sources = []
+    for name, mime in derivative_formats():
+        srcset = []
+        for width in widths:
+            height = max(1, round(original.height * width / original.width))
+            buffer = io.BytesIO()
+            original.resize((width, height), Image.LANCZOS).save(
+                buffer, name, quality=settings.POSTS_IMAGE_QUALITY)
+            path = default_storage.save(
+                f'posts/derivatives/{post_id}/{stem}-{width}.{name.lower()}',
+                ContentFile(buffer.getvalue()))
+            srcset.append(f'{default_storage.url(path)} {width}w')
+        sources.append({'type': mime, 'srcset': ', '.join(srcset)})
+    return sources
+
+
+def process_image(post_id):
+    """
+    Готовит миниатюру и адаптивные копии картинки записи и сохраняет их
+    адреса.
+    """
+    post = Post.objects.filter(pk=post_id).for_feed().first()
+    if post is None or not post.image:
+        return
+    thumbnail = get_thumbnail(post.image, settings.POSTS_THUMBNAIL_GEOMETRY)
+    sources = generate_derivatives(post.image, post_id)
+    # Картинку могли заменить, пока готовились копии
+    updated = Post.objects.filter(pk=post_id, image=post.image.name).update(
+        thumbnail=thumbnail.url, derivatives=json.dumps(sources),
+        version=F('version') + 1)
+    if updated:
+        versions.bump(*versions.post_names(post))
+
+
+def run_in_background(post_id):
+    try:
+        process_image(post_id)
+    except Exception:
+        logger.exception('Не удалось обработать картинку записи %s',
+                         post_id)
+    finally:
+        connection.close()
+
+
+def schedule_image(post):
+    """
+    Ставит обработку картинки в очередь после фиксации транзакции.
+    """
+    if not settings.POSTS_IMAGE_WORKERS:
+        transaction.on_commit(lambda: process_image(post.pk))
+        return
+    transaction.on_commit(
+        lambda: get_executor().submit(run_in_background, post.pk))
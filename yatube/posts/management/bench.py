@@ -0,0 +1,78 @@
+"""
+Общие утилиты для команд-бенчмарков.
+"""
+import statistics
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+
+
+@contextmanager
+def test_database(verbosity=0, name=None):
+    """
+    Создаёт временную тестовую БД, чтобы замеры не трогали рабочие данные.
+
+    name - файл базы, если замер должен идти не в памяти.
+    """
+    old_name = connection.settings_dict['NAME']
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    old_test_name = test_settings.get('NAME')
+    if name is not None:
+        test_settings['NAME'] = name
+    connection.creation.create_test_db(
+        verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+        test_settings['NAME'] = old_test_name
+
+
+def measure(func, repeat):
+    """
+    Выполняет func repeat раз и возвращает длительности в секундах.
+    """
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+def summary(samples):
+    """
+    Сводка по замерам в миллисекундах: медиана, p95 и p99.
+    """
+    return {
+        'median': statistics.median(samples) * 1000,
+        'p95': percentile(samples, 95) * 1000,
+        'p99': percentile(samples, 99) * 1000,
+    }
+
+
+def regressions(baseline, results, threshold):
+    """
+    Сравнивает замеры с сохраненными: возвращает описания случаев, где
+    p95 вырос больше чем в 1 + threshold раз или запросов к базе стало
+    больше.
+    """
+    found = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if result['p95'] > before['p95'] * (1 + threshold):
+            found.append(f'{name}: p95 {before["p95"]:.2f} -> '
+                         f'{result["p95"]:.2f} мс')
+        if result['queries'] > before['queries']:
+            found.append(f'{name}: запросов {before["queries"]} -> '
+                         f'{result["queries"]}')
+    return found
@@ -0,0 +1,47 @@
+import io
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+
+from posts.cards import TEMPLATE, card_data, render_card_list
+from posts.management.bench import measure, summary, test_database
+from posts.management.synthetic import Sizes, generate
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Время отрисовки одной карточки записи: отдельный '
+            'render_to_string на каждую карточку против отрисовки всей '
+            'страницы за один проход.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cards', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=300)
+
+    def handle(self, *args, **options):
+        user = AnonymousUser()
+        with test_database():
+            generate(Sizes(users=5, posts=options['cards'], comments=0,
+                           groups=2, follows=0), stdout=io.StringIO())
+            posts = list(Post.objects.for_feed()[:options['cards']])
+            cards = [card_data(post, user) for post in posts]
+            variants = (
+                # Шаблон ищется и контекст создается на каждую карточку
+                ('по одной', lambda: [
+                    render_to_string(TEMPLATE, {'card': card})
+                    for card in cards]),
+                ('за один проход', lambda: render_card_list(cards)),
+                ('словари', lambda: [card_data(post, user)
+                                     for post in posts]),
+            )
+            for title, func in variants:
+                func()
+                result = summary(measure(func, options['repeat']))
+                self.report(title, result, len(cards))
+
+    def report(self, title, result, count):
+        self.stdout.write(
+            f'{title:<15} на карточку: медиана '
+            f'{result["median"] * 1000 / count:7.1f} мкс  '
+            f'p95 {result["p95"] * 1000 / count:7.1f} мкс')
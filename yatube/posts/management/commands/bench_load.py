@@ -0,0 +1,158 @@
+import asyncio
+import importlib
+import io
+import itertools
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.test.utils import override_settings
+
+from posts.management.bench import summary, test_database
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+def wsgi_environ(path):
+    return {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'localhost',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+
+
+def asgi_scope(path):
+    return {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': b'',
+        'root_path': '',
+        'headers': [(b'host', b'localhost')],
+        'server': ('localhost', 80),
+        'client': ('127.0.0.1', 50000),
+    }
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест страниц для чтения: запросы в секунду и p99 '
+            'через WSGI и через ASGI при одинаковом числе потоков.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Потоков, выполняющих запросы.')
+        parser.add_argument('--connections', type=int, default=64,
+                            help='Одновременных клиентов.')
+        parser.add_argument('--page-cache', action='store_true',
+                            help='Не отключать кэш страниц для анонимов.')
+
+    def handle(self, *args, **options):
+        page_cache_timeout = None if options['page_cache'] else 0
+        with test_database(), override_settings(
+                POSTS_PAGE_CACHE_TIMEOUT=page_cache_timeout,
+                ASGI_THREADS=options['workers']):
+            paths = self.create_data()
+            requests = list(itertools.islice(
+                itertools.cycle(paths), options['requests']))
+            with ThreadPoolExecutor(options['workers']) as pool:
+                wsgi = self.wsgi_caller(pool)
+                self.report('wsgi', asyncio.run(
+                    self.load(wsgi, requests, options['connections'])))
+            asgi = self.asgi_caller()
+            self.report('asgi', asyncio.run(
+                self.load(asgi, requests, options['connections'])))
+
+    def create_data(self):
+        authors = [User.objects.create(username=f'author{i}')
+                   for i in range(10)]
+        group = Group.objects.create(title='Группа', slug='bench',
+                                     description='Описание')
+        for author in authors:
+            for i in range(30):
+                post = Post.objects.create(
+                    text=f'Пост {i}', author=author, group=group)
+                Comment.objects.create(post=post, author=authors[0],
+                                       text='Комментарий')
+        for author in authors[1:]:
+            Follow.objects.create(user=authors[0], author=author)
+        post = Post.objects.filter(author=authors[1]).first()
+        return ['/', '/group/bench/', f'/{authors[1].username}/',
+                f'/{authors[1].username}/{post.id}/']
+
+    @staticmethod
+    def wsgi_caller(pool):
+        """
+        WSGI-сервер с пулом из workers потоков: запросы сверх него ждут
+        в очереди.
+        """
+        application = get_wsgi_application()
+
+        def call(path):
+            response = application(wsgi_environ(path), lambda *args: None)
+            b''.join(response)
+            response.close()
+
+        async def request(path):
+            await asyncio.get_running_loop().run_in_executor(
+                pool, call, path)
+        return request
+
+    @staticmethod
+    def asgi_caller():
+        application = importlib.import_module('yatube.asgi').application
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            pass
+
+        async def request(path):
+            await application(asgi_scope(path), receive, send)
+        return request
+
+    @staticmethod
+    async def load(request, requests, connections):
+        """
+        Выполняет запросы не более чем connections одновременно и
+        возвращает их длительности вместе с ожиданием в очереди.
+        """
+        semaphore = asyncio.Semaphore(connections)
+
+        async def timed(path):
+            async with semaphore:
+                start = time.perf_counter()
+                await request(path)
+                return time.perf_counter() - start
+
+        start = time.perf_counter()
+        samples = await asyncio.gather(*(timed(path) for path in requests))
+        return samples, time.perf_counter() - start
+
+    def report(self, mode, result):
+        samples, elapsed = result
+        stats = summary(samples)
+        self.stdout.write(
+            f'{mode}: {len(samples) / elapsed:8.1f} запросов/с  '
+            f'медиана {stats["median"]:7.2f} мс  '
+            f'p99 {stats["p99"]:7.2f} мс')
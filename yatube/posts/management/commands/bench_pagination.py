@@ -0,0 +1,65 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+
+from posts.management.bench import measure, summary, test_database
+from posts.models import Post
+from posts.paginators import (NEXT, HasNextPaginator, KeysetPaginator,
+                              make_cursor)
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает время выдачи первой и глубокой страницы ленты '
+            'для постраничного вывода по номеру, по номеру без подсчета '
+            'записей и по курсору.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=5000,
+                            help='Номер глубокой страницы.')
+        parser.add_argument('--per-page', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with test_database():
+            self.run(options['pages'], options['per_page'],
+                     options['repeat'])
+
+    def run(self, pages, per_page, repeat):
+        total = pages * per_page
+        self.stdout.write(f'Создаём {total} записей...')
+        author = User.objects.create(username='bench')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=author) for i in range(total))
+        post_list = Post.objects.all()
+        last_before_deep = post_list.order_by('-pub_date', '-id')[
+            (pages - 1) * per_page - 1]
+        deep_cursor = make_cursor(last_before_deep, NEXT)
+
+        def offset_page(number):
+            return lambda: list(
+                Paginator(post_list, per_page).get_page(number))
+
+        def has_next_page(number):
+            return lambda: list(
+                HasNextPaginator(post_list, per_page).get_page(number))
+
+        def keyset_page(cursor):
+            return lambda: list(
+                KeysetPaginator(post_list, per_page).get_page(cursor))
+
+        cases = (
+            ('offset', 1, offset_page(1)),
+            ('offset', pages, offset_page(pages)),
+            ('has_next', 1, has_next_page(1)),
+            ('has_next', pages, has_next_page(pages)),
+            ('keyset', 1, keyset_page(None)),
+            ('keyset', pages, keyset_page(deep_cursor)),
+        )
+        for mode, number, func in cases:
+            stats = summary(measure(func, repeat))
+            self.stdout.write(
+                f'{mode:<8} страница {number:<6} '
+                f'медиана {stats["median"]:8.2f} мс  '
+                f'p95 {stats["p95"]:8.2f} мс')
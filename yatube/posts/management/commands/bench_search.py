@@ -0,0 +1,66 @@
+import random
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from posts import search
+from posts.management.bench import measure, summary, test_database
+from posts.models import Post
+
+User = get_user_model()
+
+WORDS = ('запись', 'новость', 'фотография', 'город', 'утро', 'прогулка',
+         'книга', 'читать', 'писать', 'красивый', 'большой', 'друг',
+         'погода', 'дорога', 'музыка', 'концерт', 'море', 'отпуск',
+         'работа', 'проект')
+RARE_WORD = 'землетрясение'
+
+
+class Command(BaseCommand):
+    help = ('Замеряет время поиска по индексу и по LIKE на большом '
+            'числе записей.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--backend', default='auto',
+                            choices=('auto', 'fts5', 'terms'))
+
+    def handle(self, *args, **options):
+        with test_database(), override_settings(
+                POSTS_SEARCH_BACKEND=options['backend']):
+            self.run(options['posts'], options['repeat'])
+
+    def run(self, total, repeat):
+        self.stdout.write(f'Создаём {total} записей...')
+        author = User.objects.create(username='bench')
+        rng = random.Random(0)
+        for start in range(0, total, 10000):
+            Post.objects.bulk_create(
+                Post(text=self.text(rng, number), author=author)
+                for number in range(start, min(start + 10000, total)))
+        self.stdout.write('Строим индекс...')
+        search.rebuild()
+        backend = 'fts5' if search.use_fts() else 'terms'
+        queries = (('частое слово', 'городе'),
+                   ('два слова', 'красивое море'),
+                   ('редкое слово', 'землетрясения'))
+        for title, query in queries:
+            results = search.SearchResults(query)
+            index_stats = summary(measure(lambda: results[:10], repeat))
+            count_stats = summary(measure(results.count, repeat))
+            like = Post.objects.filter(text__icontains=query.split()[0])
+            like_stats = summary(measure(lambda: list(like[:10]), repeat))
+            self.stdout.write(
+                f'{title:<13} {backend}: страница '
+                f'{index_stats["median"]:8.2f} мс, число '
+                f'{count_stats["median"]:8.2f} мс; '
+                f'LIKE {like_stats["median"]:8.2f} мс')
+
+    @staticmethod
+    def text(rng, number):
+        words = rng.choices(WORDS, k=12)
+        if number % 10000 == 0:
+            words.append(RARE_WORD)
+        return ' '.join(words)
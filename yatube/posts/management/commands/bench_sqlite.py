@@ -0,0 +1,113 @@
+import io
+import os
+import random
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from django.test.utils import override_settings
+
+from posts.management.bench import summary, test_database
+from posts.management.synthetic import Sizes, generate
+from posts.models import Comment, Post
+from yatube.sqlite import serialize_writes
+
+User = get_user_model()
+
+# Значения SQLite по умолчанию: журнал отката, synchronous=FULL
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'DELETE',
+    'synchronous': 'FULL',
+    'cache_size': -2000,
+    'mmap_size': 0,
+    'temp_store': 'DEFAULT',
+}
+
+
+class Command(BaseCommand):
+    help = ('Одновременные чтения ленты и запись комментариев в файловую '
+            'SQLite: настройки по умолчанию против SQLITE_PRAGMAS и '
+            'очереди записи.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=6)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--posts', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Замер только для SQLite')
+        profiles = (
+            ('по умолчанию', DEFAULT_PRAGMAS, False),
+            ('PRAGMA', settings.SQLITE_PRAGMAS, False),
+            ('PRAGMA и очередь', settings.SQLITE_PRAGMAS, True),
+        )
+        with tempfile.TemporaryDirectory() as directory, test_database(
+                name=os.path.join(directory, 'bench.sqlite3')):
+            generate(Sizes(users=50, posts=options['posts'], comments=0,
+                           groups=5), stdout=io.StringIO())
+            users = list(User.objects.values_list('id', flat=True))
+            posts = list(Post.objects.values_list('id', flat=True))
+            for title, pragmas, serialize in profiles:
+                connection.close()
+                with override_settings(SQLITE_PRAGMAS=pragmas,
+                                       SQLITE_SERIALIZE_WRITES=serialize,
+                                       POSTS_PAGE_CACHE_TIMEOUT=0):
+                    result = self.run(users, posts, options)
+                self.report(title, result, options['seconds'])
+
+    def run(self, users, posts, options):
+        deadline = time.perf_counter() + options['seconds']
+        result = {'read': [], 'write': [], 'errors': 0}
+        lock = threading.Lock()
+
+        def read():
+            list(Post.objects.for_feed()[:10])
+
+        @serialize_writes
+        def write(request):
+            Comment.objects.create(post_id=random.choice(posts),
+                                   author_id=random.choice(users),
+                                   text='Комментарий')
+
+        def worker(kind, operation):
+            samples, errors = [], 0
+            try:
+                while time.perf_counter() < deadline:
+                    start = time.perf_counter()
+                    try:
+                        operation()
+                    except OperationalError:
+                        errors += 1
+                        continue
+                    samples.append(time.perf_counter() - start)
+            finally:
+                connections.close_all()
+            with lock:
+                result[kind] += samples
+                result['errors'] += errors
+
+        threads = [threading.Thread(target=worker, args=('read', read))
+                   for _ in range(options['readers'])]
+        threads += [threading.Thread(target=worker,
+                                     args=('write', lambda: write(None)))
+                    for _ in range(options['writers'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return result
+
+    def report(self, title, result, seconds):
+        line = f'{title:<17}'
+        for kind, name in (('read', 'чтений'), ('write', 'записей')):
+            samples = result[kind]
+            p99 = summary(samples)['p99'] if samples else 0
+            line += (f' {len(samples) / seconds:8.1f} {name}/с '
+                     f'(p99 {p99:7.2f} мс)')
+        self.stdout.write(f'{line}  ошибок {result["errors"]}')
@@ -0,0 +1,72 @@
+import copy
+import io
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from posts.management.bench import measure, summary, test_database
+from posts.management.synthetic import Sizes, generate
+from posts.models import Post
+from yatube.warmup import warm_up
+
+
+class Command(BaseCommand):
+    help = ('Время отрисовки главной страницы: загрузчики без кэша, '
+            'кэширующий загрузчик и кэширующий загрузчик с прогревом.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def handle(self, *args, **options):
+        variants = (
+            ('без кэша', settings.TEMPLATE_LOADERS, False),
+            ('кэш', self.cached(), False),
+            ('кэш и прогрев', self.cached(), True),
+        )
+        with test_database():
+            generate(Sizes(users=5, posts=10, comments=0, groups=2,
+                           follows=0), stdout=io.StringIO())
+            page = Paginator(Post.objects.for_feed(), 10).get_page(1)
+            # Записи выбираются один раз, замеряется только отрисовка
+            page.object_list = list(page.object_list)
+            request = RequestFactory().get('/')
+            request.user = AnonymousUser()
+            for title, loaders, warm in variants:
+                # Новые TEMPLATES пересоздают шаблонизатор с пустым кэшем
+                with override_settings(TEMPLATES=self.templates(loaders),
+                                       POSTS_CARD_CACHE_TIMEOUT=0):
+                    start = time.perf_counter()
+                    if warm:
+                        warm_up()
+                    warm_up_time = time.perf_counter() - start
+
+                    def render():
+                        render_to_string('posts/index.html',
+                                         {'page': page}, request)
+                    first = measure(render, 1)[0]
+                    samples = measure(render, options['repeat'])
+                self.report(title, warm_up_time, first, summary(samples))
+
+    @staticmethod
+    def cached():
+        return [('django.template.loaders.cached.Loader',
+                 settings.TEMPLATE_LOADERS)]
+
+    @staticmethod
+    def templates(loaders):
+        templates = copy.deepcopy(settings.TEMPLATES)
+        templates[0]['OPTIONS']['loaders'] = loaders
+        return templates
+
+    def report(self, title, warm_up_time, first, result):
+        self.stdout.write(
+            f'{title:<14} прогрев {warm_up_time * 1000:7.2f} мс  '
+            f'первая отрисовка {first * 1000:7.2f} мс  '
+            f'медиана {result["median"]:6.2f} мс  '
+            f'p95 {result["p95"]:6.2f} мс')
@@ -0,0 +1,153 @@
+import dataclasses
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from posts import urls
+from posts.management.bench import regressions, summary, test_database
+from posts.management.synthetic import Sizes, generate
+from posts.models import Group, Post
+
+
+class Command(BaseCommand):
+    help = ('Прогоняет все адреса posts/urls.py через тестовый клиент на '
+            'синтетических данных и выводит запросы в секунду, '
+            'перцентили времени ответа и число запросов к базе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--posts', type=int, default=5000)
+        parser.add_argument('--groups', type=int, default=10)
+        parser.add_argument('--comments', type=int, default=10000)
+        parser.add_argument('--follows', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--page-cache', action='store_true',
+                            help='Не отключать кэш страниц для анонимов.')
+        parser.add_argument('--save', metavar='FILE',
+                            help='Сохранить результаты как базовые.')
+        parser.add_argument('--baseline', metavar='FILE',
+                            help='Сравнить с базовыми результатами.')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Допустимый рост p95, доля от базового.')
+
+    def handle(self, *args, **options):
+        sizes = Sizes(**{name: options[name] for name in (
+            'users', 'posts', 'groups', 'comments', 'follows', 'seed')})
+        page_cache_timeout = None if options['page_cache'] else 0
+        with test_database(), override_settings(
+                POSTS_PAGE_CACHE_TIMEOUT=page_cache_timeout,
+                POSTS_IMAGE_WORKERS=0):
+            self.stdout.write(f'Создаём данные: {dataclasses.asdict(sizes)}')
+            user_ids = generate(sizes)
+            results = self.run(user_ids, options['repeat'])
+        if options['save']:
+            with open(options['save'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as file:
+                baseline = json.load(file)
+            found = regressions(baseline, results, options['threshold'])
+            if found:
+                raise CommandError('Регрессии:\n' + '\n'.join(found))
+            self.stdout.write('Регрессий нет')
+
+    def cases(self, user_ids):
+        """
+        Запрос для каждого адреса posts/urls.py: метод, адрес, данные и
+        нужен ли вход. Автор - самый популярный пользователь, он же
+        подписан на других.
+        """
+        post = Post.objects.filter(author_id=user_ids[0]).first()
+        author = post.author.username
+        other = Post.objects.exclude(author_id=user_ids[0]).first()
+        slug = Group.objects.values_list('slug', flat=True).first()
+        post_kwargs = {'username': author, 'post_id': post.id}
+        follow_kwargs = {'username': other.author.username}
+        word = post.text.split()[1]
+        return {
+            'index': ('get', reverse('index'), None, False),
+            'follow_index': ('get', reverse('follow_index'), None, True),
+            'follow_bulk': ('post', reverse('follow_bulk'), json.dumps(
+                {'follow': [other.author.username]}), True),
+            'new_post': ('get', reverse('new_post'), None, True),
+            'api_index': ('get', reverse('api_index'), None, False),
+            'api_post': ('get', reverse(
+                'api_post', args=[post.id]), None, False),
+            'api_comments': ('get', reverse(
+                'api_comments', args=[post.id]), None, False),
+            'api_group': ('get', reverse(
+                'api_group', args=[slug]), None, False),
+            'api_profile': ('get', reverse(
+                'api_profile', args=[author]), None, False),
+            'search': ('get', reverse('search'), {'q': word}, False),
+            'group_posts': ('get', reverse(
+                'group_posts', args=[slug]), None, False),
+            'profile': ('get', reverse('profile', args=[author]), None, False),
+            'post': ('get', reverse('post', kwargs=post_kwargs), None, False),
+            'add_comment': ('post', reverse(
+                'add_comment', kwargs=post_kwargs),
+                {'text': 'Комментарий'}, True),
+            'post_edit': ('get', reverse(
+                'post_edit', kwargs=post_kwargs), None, True),
+            'profile_follow': ('get', reverse(
+                'profile_follow', kwargs=follow_kwargs), None, True),
+            'profile_unfollow': ('get', reverse(
+                'profile_unfollow', kwargs=follow_kwargs), None, True),
+        }, post.author
+
+    def run(self, user_ids, repeat):
+        cases, author = self.cases(user_ids)
+        missing = {pattern.name for pattern in urls.urlpatterns} - set(cases)
+        if missing:
+            raise CommandError(
+                f'Нет замера для адресов: {", ".join(sorted(missing))}')
+        anonymous = Client()
+        signed_in = Client()
+        signed_in.force_login(author)
+        results = {}
+        for name, (method, path, data, login) in cases.items():
+            client = signed_in if login else anonymous
+            request = self.request(client, method, path, data)
+            with CaptureQueriesContext(connection) as queries:
+                request()
+            # Журнал запросов очищается в начале каждого запроса
+            query_count = len(queries)
+            samples = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                request()
+                samples.append(time.perf_counter() - start)
+            results[name] = {
+                'rps': round(len(samples) / sum(samples), 1),
+                **{key: round(value, 3)
+                   for key, value in summary(samples).items()},
+                'queries': query_count,
+            }
+            self.report(name, results[name])
+        return results
+
+    @staticmethod
+    def request(client, method, path, data):
+        def call():
+            if method == 'post' and isinstance(data, str):
+                response = client.post(
+                    path, data, content_type='application/json')
+            else:
+                response = getattr(client, method)(path, data)
+            if response.status_code >= 400:
+                raise CommandError(
+                    f'{method.upper()} {path}: {response.status_code}')
+        return call
+
+    def report(self, name, result):
+        self.stdout.write(
+            f'{name:<17} {result["rps"]:8.1f} запросов/с  '
+            f'медиана {result["median"]:7.2f} мс  '
+            f'p95 {result["p95"]:7.2f} мс  p99 {result["p99"]:7.2f} мс  '
+            f'запросов к базе {result["queries"]}')
@@ -0,0 +1,43 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from posts.management.transfer import COLUMNS, FORMATS, Progress, RowWriter
+
+
+class Command(BaseCommand):
+    help = ('Выгружает группы, записи, комментарии или подписки в NDJSON '
+            'или CSV потоком, не загружая таблицу в память.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=COLUMNS)
+        parser.add_argument('--output', default='-',
+                            help='Файл выгрузки, по умолчанию stdout.')
+        parser.add_argument('--format', choices=FORMATS, default='ndjson')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if options['output'] == '-':
+            self.export(sys.stdout, options)
+            return
+        with open(options['output'], 'w', encoding='utf-8',
+                  newline='') as file:
+            self.export(file, options)
+
+    def export(self, file, options):
+        model, columns = COLUMNS[options['model']]
+        writer = RowWriter(file, options['format'],
+                           [column for column, field in columns])
+        rows = model.objects.order_by('pk').values_list(
+            *(field for column, field in columns))
+        progress = Progress(self.stderr)
+        chunk_size = options['chunk_size']
+        pending = 0
+        for values in rows.iterator(chunk_size=chunk_size):
+            writer.write(values)
+            pending += 1
+            if pending == chunk_size:
+                progress.add(pending)
+                pending = 0
+        progress.add(pending)
+        progress.finish('Выгружено')
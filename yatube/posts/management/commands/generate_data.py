@@ -0,0 +1,23 @@
+import dataclasses
+
+from django.core.management.base import BaseCommand
+
+from posts.management.synthetic import Sizes, generate
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими пользователями, группами, '
+            'записями, комментариями и подписками для замеров.')
+
+    def add_arguments(self, parser):
+        for field in dataclasses.fields(Sizes):
+            parser.add_argument(
+                f'--{field.name}', type=field.type, default=field.default)
+
+    def handle(self, *args, **options):
+        sizes = Sizes(**{field.name: options[field.name]
+                         for field in dataclasses.fields(Sizes)})
+        users = generate(sizes, stdout=self.stdout)
+        self.stdout.write(
+            f'Пользователей: {len(users)}, записей: {sizes.posts}, '
+            f'комментариев: {sizes.comments}')
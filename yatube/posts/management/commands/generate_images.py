@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from posts.images import process_image
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Готовит миниатюры и адаптивные копии для записей с картинками, '
+            'у которых их нет.')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').exclude(image=None).filter(
+            Q(thumbnail='') | Q(derivatives='')).values_list('id', flat=True)
+        done = 0
+        for post_id in posts.iterator():
+            process_image(post_id)
+            done += 1
+        self.stdout.write(f'Картинок обработано: {done}')
@@ -0,0 +1,108 @@
+import itertools
+import os
+import sys
+
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from posts.management.transfer import (COLUMNS, FORMATS, Progress,
+                                       build_objects, imported_dates,
+                                       read_rows)
+from posts.models import Comment, Post
+
+# Команды, которые пересчитывают данные, не заполняемые bulk_create
+REBUILD = {
+    'group': (),
+    'post': ('rebuild_counters', 'rebuild_timelines', 'rebuild_search_index'),
+    'comment': ('rebuild_counters', 'rebuild_search_index'),
+    'follow': ('rebuild_counters', 'rebuild_timelines'),
+}
+
+
+class Command(BaseCommand):
+    help = ('Загружает группы, записи, комментарии или подписки из NDJSON '
+            'или CSV пачками через bulk_create, а затем пересчитывает '
+            'счетчики, ленты и поисковый индекс.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=COLUMNS)
+        parser.add_argument('input', help='Файл выгрузки или - для stdin.')
+        parser.add_argument('--format', choices=FORMATS, default='ndjson')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Строк в одной транзакции.')
+        parser.add_argument('--create-users', action='store_true',
+                            help='Создавать неизвестных пользователей.')
+        parser.add_argument('--media-from',
+                            help='Каталог, из которого копировать картинки '
+                                 'записей, если их нет в хранилище.')
+        parser.add_argument('--skip-rebuild', action='store_true',
+                            help='Не пересчитывать производные данные.')
+
+    def handle(self, *args, **options):
+        if options['input'] == '-':
+            self.load(sys.stdin, options)
+        else:
+            with open(options['input'], encoding='utf-8',
+                      newline='') as file:
+                self.load(file, options)
+        if not options['skip_rebuild']:
+            for command in REBUILD[options['model']]:
+                call_command(command, stdout=self.stdout)
+            # Версии страниц и закэшированные счетчики устарели
+            cache.clear()
+
+    def load(self, file, options):
+        name = options['model']
+        model = COLUMNS[name][0]
+        rows = read_rows(file, options['format'])
+        progress = Progress(self.stderr)
+        skipped = 0
+        with imported_dates(model):
+            while True:
+                batch = list(itertools.islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                try:
+                    objects = build_objects(
+                        name, batch, options['create_users'])
+                except (KeyError, ValueError) as error:
+                    raise CommandError(
+                        f'Некорректная строка около №{progress.done + 1}: '
+                        f'{error}')
+                with transaction.atomic():
+                    model.objects.bulk_create(objects, ignore_conflicts=True)
+                if options['media_from'] and name == 'post':
+                    self.copy_images(objects, options['media_from'])
+                skipped += len(batch) - len(objects)
+                progress.add(len(batch))
+        progress.finish('Обработано')
+        if skipped:
+            self.stderr.write(
+                f'Пропущено строк (неизвестный пользователь или запись, '
+                f'подписка на себя): {skipped}')
+        if model in (Post, Comment):
+            self.reset_sequences(model)
+
+    @staticmethod
+    def copy_images(posts, source):
+        for post in posts:
+            name = post.image.name
+            if not name or default_storage.exists(name):
+                continue
+            path = os.path.join(source, name)
+            if os.path.exists(path):
+                with open(path, 'rb') as image:
+                    default_storage.save(name, File(image))
+
+    @staticmethod
+    def reset_sequences(model):
+        # Записи загружаются со своими id, счетчик id нужно сдвинуть
+        statements = connection.ops.sequence_reset_sql(no_style(), [model])
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
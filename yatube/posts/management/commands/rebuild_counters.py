@@ -0,0 +1,61 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from posts import versions
+from posts.models import Comment, Follow, Post, Profile
+
+User = get_user_model()
+
+
+def count_of(model, field, outer='pk'):
+    """
+    Подзапрос с числом строк model, у которых field ссылается на
+    внешнюю строку.
+    """
+    counts = model.objects.filter(**{field: OuterRef(outer)}).order_by()
+    counts = counts.values(field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts), 0)
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счетчики записей, подписок и комментариев '
+            'по данным в базе.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            created, authors, posts = self.rebuild()
+        # Карточки изменившихся записей получили новые версии, а страницы
+        # с изменившимися счетчиками - новые версии страниц
+        names = {versions.author_name(username) for username in authors}
+        for post_id, username, slug in posts:
+            names.update((versions.INDEX, versions.post_name(post_id),
+                          versions.author_name(username)))
+            if slug is not None:
+                names.add(versions.group_name(slug))
+        versions.bump(*names)
+        self.stdout.write(
+            f'Профилей создано: {len(created)}, обновлено: {len(authors)}; '
+            f'записей обновлено: {len(posts)}')
+
+    @staticmethod
+    def rebuild():
+        missing = User.objects.filter(profile__isnull=True)
+        created = Profile.objects.bulk_create(
+            Profile(user_id=pk) for pk in missing.values_list('pk', flat=True))
+        counters = {
+            'posts_count': count_of(Post, 'author', 'user'),
+            'followers_count': count_of(Follow, 'author', 'user'),
+            'following_count': count_of(Follow, 'user', 'user'),
+        }
+        profiles = Profile.objects.exclude(**counters)
+        authors = list(profiles.values_list('user__username', flat=True))
+        profiles.update(**counters)
+        comment_count = count_of(Comment, 'post')
+        posts = Post.objects.exclude(comment_count=comment_count)
+        changed = list(posts.values_list(
+            'id', 'author__username', 'group__slug'))
+        posts.update(comment_count=comment_count, version=F('version') + 1)
+        return created, authors, changed
@@ -0,0 +1,28 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import timelines
+from posts.models import Follow
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Собирает заново ленты подписок по текущим подпискам.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*',
+                            help='Пользователи, по умолчанию все подписчики.')
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        users = Follow.objects.values_list('user_id', flat=True).distinct()
+        if options['usernames']:
+            users = User.objects.filter(
+                username__in=options['usernames']).values_list('id', flat=True)
+        rebuilt = 0
+        for user_id in users.iterator():
+            timelines.rebuild(user_id)
+            rebuilt += 1
+        self.stdout.write(f'Лент собрано: {rebuilt}')
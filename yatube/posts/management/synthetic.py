@@ -0,0 +1,140 @@
+"""
+Генератор синтетических данных для замеров производительности.
+
+Данные вставляются пачками через bulk_create и при одном и том же seed
+получаются одинаковыми. Популярность авторов подчиняется степенному
+закону: автор с номером k получает подписчиков, записи и комментарии
+с весом 1 / k ** exponent, как в настоящих социальных сетях, где у
+немногих авторов большая часть аудитории.
+"""
+import datetime as dt
+import itertools
+import random
+from dataclasses import dataclass
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.utils import timezone
+
+from posts.management.transfer import imported_dates
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+WORDS = ('запись', 'новость', 'фотография', 'город', 'утро', 'прогулка',
+         'книга', 'читать', 'писать', 'красивый', 'большой', 'друг',
+         'погода', 'дорога', 'музыка', 'концерт', 'море', 'отпуск',
+         'работа', 'проект')
+# Строк в одном bulk_create
+CHUNK_SIZE = 5000
+
+
+@dataclass
+class Sizes:
+    users: int = 1000
+    posts: int = 20000
+    groups: int = 20
+    comments: int = 50000
+    # Среднее число подписок одного пользователя
+    follows: int = 20
+    # Показатель степенного закона популярности авторов
+    exponent: float = 1.2
+    seed: int = 0
+    prefix: str = 'user'
+
+
+def _chunks(objects):
+    objects = iter(objects)
+    while True:
+        chunk = list(itertools.islice(objects, CHUNK_SIZE))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _weights(count, exponent):
+    return list(itertools.accumulate(
+        1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+def _text(rng, words=12):
+    return ' '.join(rng.choices(WORDS, k=words)).capitalize()
+
+
+def generate(sizes, stdout=None):
+    """
+    Заполняет базу по sizes и пересчитывает счетчики, ленты и поисковый
+    индекс. Возвращает id пользователей в порядке убывания популярности.
+    """
+    rng = random.Random(sizes.seed)
+    # Один хэш на всех: make_password на каждого занял бы минуты
+    password = make_password(None)
+    User.objects.bulk_create(
+        (User(username=f'{sizes.prefix}{number}', password=password)
+         for number in range(sizes.users)), ignore_conflicts=True)
+    user_ids = dict(User.objects.filter(
+        username__startswith=sizes.prefix).values_list('username', 'id'))
+    users = [user_ids[f'{sizes.prefix}{number}']
+             for number in range(sizes.users)]
+    weights = _weights(len(users), sizes.exponent)
+
+    Group.objects.bulk_create(
+        (Group(title=f'Группа {number}', slug=f'{sizes.prefix}-{number}',
+               description=_text(rng)) for number in range(sizes.groups)),
+        ignore_conflicts=True)
+    groups = list(Group.objects.filter(
+        slug__startswith=f'{sizes.prefix}-').values_list('id', flat=True))
+
+    follows = ((user, author) for user in users
+               for author in _authors(rng, users, weights, user,
+                                      sizes.follows))
+    for chunk in _chunks(Follow(user_id=user, author_id=author)
+                         for user, author in follows):
+        Follow.objects.bulk_create(chunk, ignore_conflicts=True)
+
+    # Записи идут от новых к старым с шагом около минуты
+    now = timezone.now()
+    posts = (Post(text=_text(rng), author_id=author,
+                  group_id=rng.choice(groups + [None]) if groups else None,
+                  pub_date=now - dt.timedelta(minutes=number))
+             for number, author in enumerate(rng.choices(
+                 users, cum_weights=weights, k=sizes.posts)))
+    with imported_dates(Post):
+        for chunk in _chunks(posts):
+            Post.objects.bulk_create(chunk)
+    post_ids = list(Post.objects.filter(
+        author__username__startswith=sizes.prefix).order_by(
+        'author_id', '-pub_date').values_list('id', flat=True))
+
+    if post_ids:
+        # Комментарии чаще достаются записям популярных авторов
+        post_weights = _weights(len(post_ids), sizes.exponent / 2)
+        comments = (Comment(post_id=post, author_id=rng.choice(users),
+                            text=_text(rng, 6),
+                            created=now - dt.timedelta(seconds=number))
+                    for number, post in enumerate(rng.choices(
+                        post_ids, cum_weights=post_weights,
+                        k=sizes.comments)))
+        with imported_dates(Comment):
+            for chunk in _chunks(comments):
+                Comment.objects.bulk_create(chunk)
+
+    for command in ('rebuild_counters', 'rebuild_timelines',
+                    'rebuild_search_index'):
+        call_command(command, stdout=stdout)
+    return users
+
+
+def _authors(rng, users, weights, user, average):
+    """
+    Авторы, на которых подписан user: их число распределено
+    равномерно от 0 до 2 * average, а выбор - по весам популярности.
+    """
+    count = min(rng.randint(0, 2 * average), len(users) - 1)
+    authors = set()
+    while len(authors) < count:
+        author = rng.choices(users, cum_weights=weights)[0]
+        if author != user:
+            authors.add(author)
+    return sorted(authors)
@@ -0,0 +1,186 @@
+"""
+Общие описания для команд выгрузки и загрузки данных.
+
+Строки читаются и пишутся потоком, поэтому память не зависит от размера
+выгрузки: в памяти держится только одна пачка строк. Пользователи
+указываются по username, группы - по slug, а записи и комментарии
+сохраняют свои id, чтобы комментарии ссылались на те же записи.
+"""
+import csv
+import json
+import time
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts.models import Comment, Follow, Group, Post, Profile
+
+User = get_user_model()
+
+# Столбец выгрузки и поле, из которого он берется
+COLUMNS = {
+    'group': (Group, (('slug', 'slug'), ('title', 'title'),
+                      ('description', 'description'))),
+    'post': (Post, (('id', 'id'), ('text', 'text'),
+                    ('pub_date', 'pub_date'), ('author', 'author__username'),
+                    ('group', 'group__slug'), ('image', 'image'))),
+    'comment': (Comment, (('id', 'id'), ('post', 'post_id'),
+                          ('author', 'author__username'), ('text', 'text'),
+                          ('created', 'created'))),
+    'follow': (Follow, (('user', 'user__username'),
+                        ('author', 'author__username'))),
+}
+FORMATS = ('ndjson', 'csv')
+
+
+def read_rows(file, data_format):
+    if data_format == 'csv':
+        yield from csv.DictReader(file)
+        return
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+@contextmanager
+def imported_dates(model):
+    """
+    Отключает auto_now_add, чтобы сохранились даты из выгрузки.
+    """
+    fields = [field for field in model._meta.fields
+              if getattr(field, 'auto_now_add', False)]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class RowWriter:
+    def __init__(self, file, data_format, columns):
+        self.file = file
+        self.data_format = data_format
+        if data_format == 'csv':
+            self.csv = csv.writer(file)
+            self.csv.writerow(columns)
+        self.columns = columns
+
+    def write(self, values):
+        # isoformat, в отличие от DjangoJSONEncoder, не отбрасывает
+        # микросекунды, по которым упорядочены ленты
+        values = [value.isoformat() if hasattr(value, 'isoformat')
+                  else value for value in values]
+        if self.data_format == 'csv':
+            self.csv.writerow('' if value is None else value
+                              for value in values)
+            return
+        self.file.write(json.dumps(dict(zip(self.columns, values)),
+                                   ensure_ascii=False))
+        self.file.write('\n')
+
+
+def parse_date(value):
+    """
+    Дата из выгрузки; пустое значение - текущее время.
+    """
+    if not value:
+        return timezone.now()
+    date = parse_datetime(value)
+    if date is None:
+        raise ValueError(f'Некорректная дата: {value}')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+def resolve_users(usernames, create):
+    """
+    Возвращает id пользователей по именам; недостающих создает, если
+    create.
+    """
+    users = dict(User.objects.filter(
+        username__in=usernames).values_list('username', 'id'))
+    missing = set(usernames) - set(users)
+    if create and missing:
+        new_users = []
+        for username in missing:
+            user = User(username=username)
+            user.set_unusable_password()
+            new_users.append(user)
+        User.objects.bulk_create(new_users)
+        created = dict(User.objects.filter(
+            username__in=missing).values_list('username', 'id'))
+        # bulk_create не посылает post_save, профили создаются здесь
+        Profile.objects.bulk_create(
+            [Profile(user_id=pk) for pk in created.values()],
+            ignore_conflicts=True)
+        users.update(created)
+    return users
+
+
+def build_objects(name, rows, create_users):
+    """
+    Объекты модели name для пачки строк; строки с неизвестными
+    пользователями пропускаются.
+    """
+    if name == 'group':
+        return [Group(slug=row['slug'], title=row['title'],
+                      description=row.get('description') or '')
+                for row in rows]
+    user_columns = ('user', 'author') if name == 'follow' else ('author',)
+    users = resolve_users(
+        {row[column] for row in rows for column in user_columns},
+        create_users)
+    rows = [row for row in rows
+            if all(row[column] in users for column in user_columns)]
+    if name == 'follow':
+        return [Follow(user_id=users[row['user']],
+                       author_id=users[row['author']])
+                for row in rows if row['user'] != row['author']]
+    if name == 'comment':
+        posts = set(Post.objects.filter(
+            id__in={int(row['post']) for row in rows}).values_list(
+            'id', flat=True))
+        return [Comment(id=row.get('id') or None, post_id=int(row['post']),
+                        author_id=users[row['author']], text=row['text'],
+                        created=parse_date(row.get('created')))
+                for row in rows if int(row['post']) in posts]
+    groups = dict(Group.objects.filter(
+        slug__in={row['group'] for row in rows if row.get('group')}
+    ).values_list('slug', 'id'))
+    return [Post(id=row.get('id') or None, text=row['text'],
+                 pub_date=parse_date(row.get('pub_date')),
+                 author_id=users[row['author']],
+                 group_id=groups.get(row.get('group')),
+                 image=row.get('image') or '')
+            for row in rows]
+
+
+class Progress:
+    """
+    Выводит число обработанных строк и скорость в строках в секунду.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.start = time.perf_counter()
+        self.done = 0
+
+    @property
+    def rate(self):
+        elapsed = time.perf_counter() - self.start
+        return self.done / elapsed if elapsed else 0
+
+    def add(self, count):
+        self.done += count
+        self.stream.write(
+            f'{self.done} строк, {self.rate:.0f} строк/с', ending='\r')
+        self.stream.flush()
+
+    def finish(self, title):
+        self.stream.write(
+            f'{title}: {self.done} строк, {self.rate:.0f} строк/с')
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.24 on 2026-10-17 06:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_post_thumbnail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='derivatives',
+            field=models.TextField(blank=True, editable=False, verbose_name='Адаптивные копии'),
+        ),
+    ]
@@ -0,0 +1,182 @@
+# Generated by Django 2.2.24 on 2026-10-17 06:07
+
+import re
+from collections import Counter
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Копия posts.search и posts.stemmer на момент миграции: модули проекта
+# могут измениться, а миграция должна строить индекс как тогда
+
+FTS_TABLE = 'posts_search'
+TEXT_WEIGHT = 2
+WORD_RE = re.compile(r'\w+')
+
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND = (('в', 'вши', 'вшись'),
+                     ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'))
+REFLEXIVE = ((), ('ся', 'сь'))
+ADJECTIVE = ((), ('ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый',
+                  'ой', 'ем', 'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому',
+                  'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею'))
+PARTICIPLE = (('ем', 'нн', 'вш', 'ющ', 'щ'), ('ивш', 'ывш', 'ующ'))
+VERB = (('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но',
+         'ет', 'ют', 'ны', 'ть', 'ешь', 'нно'),
+        ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей',
+         'уй', 'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят',
+         'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'))
+NOUN = ((), ('а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи',
+             'ии', 'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием',
+             'ем', 'ам', 'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию',
+             'ью', 'ю', 'ия', 'ья', 'я'))
+SUPERLATIVE = ((), ('ейше', 'ейш'))
+DERIVATIONAL = ((), ('ость', 'ост'))
+
+
+def _regions(word):
+    """
+    Возвращает начала областей RV и R2 слова.
+    """
+    rv = next((i + 1 for i, char in enumerate(word) if char in VOWELS),
+              len(word))
+    r1 = _after_syllable(word, 0)
+    return rv, _after_syllable(word, r1)
+
+
+def _after_syllable(word, start):
+    for i in range(start + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            return i + 1
+    return len(word)
+
+
+def _strip(word, start, endings):
+    """
+    Отрезает самое длинное окончание из endings, лежащее правее start.
+
+    endings - пара групп: окончания первой группы отрезаются, только если
+    перед ними стоит «а» или «я».
+    """
+    after_a, plain = endings
+    candidates = [(ending, True) for ending in after_a]
+    candidates += [(ending, False) for ending in plain]
+    for ending, needs_a in sorted(candidates, key=lambda c: -len(c[0])):
+        cut = len(word) - len(ending)
+        if cut < start or not word.endswith(ending):
+            continue
+        if needs_a and (cut <= start or word[cut - 1] not in 'ая'):
+            continue
+        return word[:cut]
+    return None
+
+
+def _strip_inflection(word, rv):
+    stripped = _strip(word, rv, PERFECTIVE_GERUND)
+    if stripped is not None:
+        return stripped
+    # «ся» и «сь» отрезаются, только если перед ними окончание глагола
+    # или причастия: в «запись» и «рысь» это часть основы
+    unreflexive = _strip(word, rv, REFLEXIVE)
+    if unreflexive is not None:
+        stripped = _strip(unreflexive, rv, ADJECTIVE)
+        if stripped is not None:
+            return _strip(stripped, rv, PARTICIPLE) or stripped
+        stripped = _strip(unreflexive, rv, VERB)
+        if stripped is not None:
+            return stripped
+    stripped = _strip(word, rv, ADJECTIVE)
+    if stripped is not None:
+        return _strip(stripped, rv, PARTICIPLE) or stripped
+    for endings in (VERB, NOUN):
+        stripped = _strip(word, rv, endings)
+        if stripped is not None:
+            return stripped
+    return word
+
+
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    rv, r2 = _regions(word)
+    word = _strip_inflection(word, rv)
+    if word.endswith('и') and len(word) > rv:
+        word = word[:-1]
+    word = _strip(word, r2, DERIVATIONAL) or word
+    word = _strip(word, rv, SUPERLATIVE) or word
+    if word.endswith('нн') and len(word) - 1 > rv:
+        return word[:-1]
+    if word.endswith('ь') and len(word) > rv:
+        return word[:-1]
+    return word
+
+
+def tokenize(text):
+    return [stem(word) for word in WORD_RE.findall(text.lower())]
+
+
+def fts5_supported(connection):
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        return ('ENABLE_FTS5',) in cursor.fetchall()
+
+
+def create_index(apps, schema_editor):
+    connection = schema_editor.connection
+    use_fts = fts5_supported(connection)
+    if use_fts:
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+            f"USING fts5(text, comments, tokenize='unicode61')")
+    Comment = apps.get_model('posts', 'Comment')
+    Post = apps.get_model('posts', 'Post')
+    SearchTerm = apps.get_model('posts', 'SearchTerm')
+    for post_id, text in Post.objects.values_list('id', 'text').iterator():
+        post_comments = Comment.objects.filter(
+            post_id=post_id).values_list('text', flat=True)
+        if use_fts:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'INSERT INTO {FTS_TABLE} (rowid, text, comments) '
+                    f'VALUES (%s, %s, %s)',
+                    [post_id, ' '.join(tokenize(text)),
+                     ' '.join(term for comment in post_comments
+                              for term in tokenize(comment))])
+            continue
+        weights = Counter(term[:64] for comment in post_comments
+                          for term in tokenize(comment))
+        for term in tokenize(text):
+            weights[term[:64]] += TEXT_WEIGHT
+        SearchTerm.objects.bulk_create(
+            SearchTerm(post_id=post_id, term=term, weight=weight)
+            for term, weight in weights.items())
+
+
+def drop_index(apps, schema_editor):
+    schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0007_post_derivatives'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, verbose_name='Основа слова')),
+                ('weight', models.PositiveIntegerField(verbose_name='Вес')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='posts.Post', verbose_name='Запись')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='searchterm',
+            constraint=models.UniqueConstraint(fields=('term', 'post'), name='unique_search_term'),
+        ),
+        migrations.RunPython(create_index, drop_index),
+    ]
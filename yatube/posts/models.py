@@ -1,5 +1,8 @@
+import json
+
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.db.models import F
 
 User = get_user_model()
 
@@ -16,6 +19,14 @@ class Group(models.Model):
         verbose_name_plural = 'Группы'
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """
+        Подтягивает автора и группу одним запросом.
+        """
+        return self.select_related('author', 'group')
+
+
 class Post(models.Model):
     text = models.TextField('Текст')
     pub_date = models.DateTimeField('Дата публикации', auto_now_add=True)
@@ -26,13 +37,58 @@ class Post(models.Model):
                               verbose_name='Группа')
     image = models.ImageField(upload_to='posts/', blank=True, null=True,
                               verbose_name='Изображение')
+    thumbnail = models.CharField('Миниатюра', max_length=255, blank=True,
+                                 editable=False)
+    derivatives = models.TextField('Адаптивные копии', blank=True,
+                                   editable=False)
+    comment_count = models.PositiveIntegerField(
+        'Комментариев', default=0, editable=False)
+    version = models.PositiveIntegerField(
+        'Версия', default=1, editable=False)
+
+    objects = PostQuerySet.as_manager()
 
     def __str__(self):
         return self.text[:15]
 
+    @property
+    def image_sources(self):
+        """
+        Описания <source> для тега <picture>: тип и srcset копий картинки.
+        """
+        try:
+            return json.loads(self.derivatives)
+        except ValueError:
+            return []
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+        # Новая версия сбрасывает закэшированную карточку записи. Она
+        # увеличивается в самом UPDATE: экземпляр, прочитанный до чужой
+        # правки или комментария, не повторит уже занятый номер
+        self.version = F('version') + 1
+        # comment_count пишут только сигналы комментариев через F():
+        # полная запись устаревшего экземпляра затерла бы счетчик
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            update_fields = [field.name for field in self._meta.concrete_fields
+                             if not field.primary_key
+                             and field.name != 'comment_count']
+        kwargs['update_fields'] = {*update_fields, 'version'}
+        super().save(*args, **kwargs)
+        self.refresh_from_db(fields=['version'])
+
     class Meta:
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
         verbose_name_plural = 'Посты'
+        indexes = (
+            models.Index(fields=('-pub_date', '-id'), name='post_date_idx'),
+            models.Index(fields=('author', '-pub_date', '-id'),
+                         name='post_author_date_idx'),
+            models.Index(fields=('group', '-pub_date', '-id'),
+                         name='post_group_date_idx'),
+        )
 
 
 class Comment(models.Model):
@@ -49,6 +105,10 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ('-created',)
+        indexes = (
+            models.Index(fields=('post', '-created'),
+                         name='comment_post_created_idx'),
+        )
 
 
 class Follow(models.Model):
@@ -59,5 +119,91 @@ class Follow(models.Model):
                                related_name='following',
                                verbose_name='Автор')
 
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(fields=('user', 'author'),
+                                    name='unique_follow'),
+        )
+
     def __str__(self):
         return self.author.username
+
+
+class ProfileQuerySet(models.QuerySet):
+    def for_user(self, user):
+        """
+        Профиль user. Пользователям, созданным bulk_create или загруженным
+        из фикстуры, post_save профиль не создал: такой профиль создается
+        здесь со счетчиками по базе.
+        """
+        try:
+            return user.profile
+        except Profile.DoesNotExist:
+            pass
+        user.profile, _ = self.get_or_create(user=user, defaults={
+            'posts_count': Post.objects.filter(author=user).count(),
+            'followers_count': Follow.objects.filter(author=user).count(),
+            'following_count': Follow.objects.filter(user=user).count(),
+        })
+        return user.profile
+
+
+class Profile(models.Model):
+    """
+    Счетчики пользователя, которые обновляются при записи, а не считаются
+    на каждый просмотр профиля.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE,
+                                related_name='profile',
+                                verbose_name='Пользователь')
+    posts_count = models.PositiveIntegerField('Записей', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+
+    objects = ProfileQuerySet.as_manager()
+
+    def __str__(self):
+        return self.user.username
+
+
+class TimelineEntry(models.Model):
+    """
+    Запись в заранее собранной ленте подписок пользователя.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='timeline',
+                             verbose_name='Читатель')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name='timeline_entries',
+                             verbose_name='Запись')
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        ordering = ('-pub_date', '-post_id')
+        constraints = (
+            models.UniqueConstraint(fields=('user', 'post'),
+                                    name='unique_timeline_entry'),
+        )
+        indexes = (
+            models.Index(fields=('user', '-pub_date', '-post'),
+                         name='timeline_user_date_idx'),
+        )
+
+
+class SearchTerm(models.Model):
+    """
+    Основа слова в обратном поисковом индексе записей.
+
+    Используется, когда база не поддерживает FTS5.
+    """
+    term = models.CharField('Основа слова', max_length=64)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name='search_terms',
+                             verbose_name='Запись')
+    weight = models.PositiveIntegerField('Вес')
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(fields=('term', 'post'),
+                                    name='unique_search_term'),
+        )
@@ -0,0 +1,82 @@
+"""
+Кэш целых страниц для анонимных посетителей.
+
+Ключ страницы составлен из пути, номера страницы (или курсора) и версий
+из posts.versions. Сигналы увеличивают версии только тех лент и записей,
+которых коснулось изменение, поэтому новая запись автора сбрасывает его
+профиль, ленту группы и главную, но не страницы других авторов. Старые
+копии не удаляются, а вытесняются по сроку хранения.
+
+Попадания и промахи считаются в памяти процесса и отдаются через
+/internal/metrics: запись счетчиков в общий кэш стоила бы транзакции на
+запрос.
+"""
+import functools
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+PAGE_PARAMS = ('page', 'cursor')
+
+_stats = {'hits': 0, 'misses': 0}
+_lock = threading.Lock()
+
+
+def page_key(request, versions):
+    params = '&'.join(f'{name}={request.GET.get(name, "")}'
+                      for name in PAGE_PARAMS)
+    raw = f'{request.path}|{params}|{versions}'
+    return f'page:{hashlib.md5(raw.encode()).hexdigest()}'
+
+
+def count(name):
+    with _lock:
+        _stats[name] += 1
+
+
+def stats():
+    """
+    Число попаданий и промахов кэша страниц в этом процессе.
+    """
+    with _lock:
+        return dict(_stats)
+
+
+def reset():
+    with _lock:
+        for name in _stats:
+            _stats[name] = 0
+
+
+def cache_page(view, versions_func, settle_func):
+    """
+    Отдает страницу из кэша, пока не изменились ее версии.
+
+    versions_func(request, *args, **kwargs) возвращает строку версий или
+    None, если версии страницы еще не заведены; settle_func заводит их
+    после успешного ответа и возвращает строку версий.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        timeout = settings.POSTS_PAGE_CACHE_TIMEOUT
+        if not timeout:
+            return view(request, *args, **kwargs)
+        versions = versions_func(request, *args, **kwargs)
+        cached = None if versions is None else cache.get(
+            page_key(request, versions))
+        if cached is not None:
+            count('hits')
+            content, content_type = cached
+            return HttpResponse(content, content_type=content_type)
+        count('misses')
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming:
+            if versions is None:
+                versions = settle_func(request, *args, **kwargs)
+            cache.set(page_key(request, versions),
+                      (response.content, response['Content-Type']), timeout)
+        return response
+    return wrapper
@@ -0,0 +1,220 @@
+import base64
+import datetime as dt
+
+from django.conf import settings
+from django.core.paginator import Page, Paginator
+from django.utils.functional import cached_property
+
+from yatube.cache import get_or_compute
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def make_cursor(post, direction):
+    """
+    Кодирует ключ (pub_date, id) записи в строку для параметра ?cursor=.
+
+    post - запись или словарь из values() с полями pub_date и id.
+    """
+    if isinstance(post, dict):
+        pub_date, pk = post['pub_date'], post['id']
+    else:
+        pub_date, pk = post.pub_date, post.id
+    raw = f'{direction}|{pub_date.isoformat()}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def parse_cursor(cursor):
+    """
+    Разбирает строку курсора, при ошибке выбрасывает ValueError.
+    """
+    padding = '=' * (-len(cursor) % 4)
+    try:
+        raw = base64.urlsafe_b64decode(cursor + padding).decode()
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Некорректный курсор')
+    direction, pub_date, pk = raw.split('|')
+    if direction not in (NEXT, PREVIOUS):
+        raise ValueError('Некорректное направление курсора')
+    return direction, dt.datetime.fromisoformat(pub_date), int(pk)
+
+
+class KeysetPage(Page):
+    """
+    Страница ленты, выбранная по курсору.
+
+    Номера у такой страницы нет, вместо него шаблон получает курсоры
+    соседних страниц.
+    """
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        super().__init__(object_list, None, paginator)
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    @property
+    def next_cursor(self):
+        if self._has_next:
+            return make_cursor(self.object_list[-1], NEXT)
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous:
+            return make_cursor(self.object_list[0], PREVIOUS)
+        return None
+
+
+class KeysetPaginator(Paginator):
+    """
+    Постраничный вывод по курсору (pub_date, id).
+
+    Страница выбирается условием по ключу крайней записи соседней
+    страницы, поэтому глубокие страницы стоят столько же, сколько первая:
+    нет ни OFFSET, ни COUNT(*).
+    """
+    keyset = True
+
+    def __init__(self, object_list, per_page):
+        # Не набор записей (лента подписок) сам выбирает страницу: seek()
+        if hasattr(object_list, 'order_by'):
+            object_list = object_list.order_by('-pub_date', '-id')
+        super().__init__(object_list, per_page)
+
+    def get_page(self, cursor):
+        try:
+            direction, pub_date, pk = parse_cursor(cursor)
+        except (TypeError, ValueError):
+            direction = pub_date = pk = None
+        if hasattr(self.object_list, 'seek'):
+            posts = self.object_list.seek(
+                None if direction is None else (pub_date, pk),
+                direction == PREVIOUS, self.per_page + 1)
+        else:
+            posts = list(self.posts(direction, pub_date, pk))
+        has_more = len(posts) > self.per_page
+        posts = posts[:self.per_page]
+        if direction == PREVIOUS:
+            posts.reverse()
+            return KeysetPage(posts, self, has_next=bool(posts),
+                              has_previous=has_more)
+        return KeysetPage(posts, self, has_next=has_more,
+                          has_previous=direction == NEXT and bool(posts))
+
+    def posts(self, direction, pub_date, pk):
+        post_list = self.object_list
+        limit = self.per_page + 1
+        if direction is None:
+            return post_list[:limit]
+        lookup = 'lt'
+        if direction == PREVIOUS:
+            lookup = 'gt'
+            post_list = post_list.order_by('pub_date', 'id')
+        # Два диапазона по индексу вместо OR, с которым SQLite проходит
+        # индекс от начала, как в timelines._latest
+        same_date = post_list.filter(
+            pub_date=pub_date, **{f'id__{lookup}': pk})
+        older = post_list.filter(**{f'pub_date__{lookup}': pub_date})
+        return [*same_date[:limit], *older[:limit]][:limit]
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Постраничный вывод, который берет COUNT(*) ленты из общего кэша.
+
+    Число записей пересчитывает только один запрос, остальные в это
+    время получают прежнее значение. Если число уже известно из
+    денормализованных счетчиков (count), лента не считается вовсе.
+    """
+
+    def __init__(self, object_list, per_page, count_key, count=None):
+        super().__init__(object_list, per_page)
+        self.count_key = count_key
+        if count is not None:
+            self.__dict__['count'] = count
+
+    @cached_property
+    def count(self):
+        return get_or_compute(
+            count_cache_key(self.count_key),
+            lambda: Paginator.count.func(self),
+            settings.POSTS_COUNT_CACHE_TIMEOUT,
+        )
+
+
+class HasNextPaginator(Paginator):
+    """
+    Постраничный вывод по номеру без COUNT(*).
+
+    Страница выбирается с одной лишней записью: если она нашлась, есть и
+    следующая страница. Число записей считается равным числу уже
+    увиденных, поэтому страница остается обычной Page, а номера страниц
+    известны только до следующей.
+    """
+    counted = False
+
+    def get_page(self, number):
+        try:
+            number = max(int(number), 1)
+        except (TypeError, ValueError):
+            number = 1
+        bottom = (number - 1) * self.per_page
+        posts = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not posts and number > 1:
+            # Номер за концом ленты: последняя страница неизвестна
+            return self.get_page(1)
+        self.__dict__['count'] = bottom + len(posts)
+        return self._get_page(posts[:self.per_page], number, self)
+
+
+def page_window(page, on_each_side=2, on_ends=1):
+    """
+    Номера страниц вокруг текущей и по краям; пропуски между ними
+    обозначены None. Отрисовка не зависит от длины ленты.
+    """
+    count = page.paginator.num_pages
+    if count <= (on_each_side + on_ends + 1) * 2:
+        return list(range(1, count + 1))
+    numbers = sorted({
+        *range(1, on_ends + 1),
+        *range(max(page.number - on_each_side, 1),
+               min(page.number + on_each_side, count) + 1),
+        *range(count - on_ends + 1, count + 1),
+    })
+    window = []
+    for number in numbers:
+        if window and number - window[-1] == 2:
+            window.append(number - 1)
+        elif window and number - window[-1] > 2:
+            window.append(None)
+        window.append(number)
+    return window
+
+
+def count_cache_key(feed):
+    return f'feed_count:{feed}'
+
+
+def paginate(request, post_list, feed, count=None):
+    """
+    Возвращает страницу ленты в режиме, заданном POSTS_PAGINATION.
+
+    feed - имя ленты, под которым в кэше хранится число ее записей;
+    count - число записей ленты, если оно уже известно.
+    """
+    if settings.POSTS_PAGINATION == 'keyset':
+        paginator = KeysetPaginator(post_list, settings.POSTS_PER_PAGE)
+        return paginator.get_page(request.GET.get('cursor'))
+    if settings.POSTS_PAGINATION == 'has_next':
+        paginator = HasNextPaginator(post_list, settings.POSTS_PER_PAGE)
+        return paginator.get_page(request.GET.get('page'))
+    paginator = CachedCountPaginator(
+        post_list, settings.POSTS_PER_PAGE, feed, count)
+    return paginator.get_page(request.GET.get('page'))
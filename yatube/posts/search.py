@@ -0,0 +1,211 @@
+"""
+Полнотекстовый поиск по записям и комментариям к ним.
+
+Каждой записи соответствует документ из основ слов ее текста и
+комментариев. Основы получает posts.stemmer, поэтому индекс не зависит
+от морфологии СУБД. Если SQLite собран с FTS5, документы хранятся в
+виртуальной таблице posts_search и ранжируются по BM25, иначе - в
+обратном индексе SearchTerm, который работает на любой базе.
+"""
+import functools
+import itertools
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Sum
+
+from .models import Comment, Post, SearchTerm
+from .stemmer import stem
+
+FTS_TABLE = 'posts_search'
+# Вес слова из текста записи относительно слова из комментария
+TEXT_WEIGHT = 2
+WORD_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """
+    Разбивает текст на основы слов.
+    """
+    return [stem(word) for word in WORD_RE.findall(text.lower())]
+
+
+@functools.lru_cache(maxsize=None)
+def fts5_supported(vendor):
+    if vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        return ('ENABLE_FTS5',) in cursor.fetchall()
+
+
+def use_fts():
+    backend = settings.POSTS_SEARCH_BACKEND
+    if backend == 'auto':
+        return fts5_supported(connection.vendor)
+    return backend == 'fts5'
+
+
+def store(post_id, text, comments):
+    """
+    Записывает документ записи в индекс, заменяя прежний.
+    """
+    if use_fts():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id])
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, text, comments) '
+                f'VALUES (%s, %s, %s)',
+                [post_id, ' '.join(tokenize(text)),
+                 ' '.join(term for comment in comments
+                          for term in tokenize(comment))])
+        return
+    SearchTerm.objects.filter(post_id=post_id).delete()
+    SearchTerm.objects.bulk_create(
+        SearchTerm(post_id=post_id, term=term, weight=weight)
+        for term, weight in _weights(text, comments).items())
+
+
+def _weights(text, comments):
+    weights = Counter(term[:64] for comment in comments
+                      for term in tokenize(comment))
+    for term in tokenize(text):
+        weights[term[:64]] += TEXT_WEIGHT
+    return weights
+
+
+def index_post(post_id):
+    text = Post.objects.filter(pk=post_id).values_list(
+        'text', flat=True).first()
+    if text is None:
+        remove_post(post_id)
+        return
+    comments = Comment.objects.filter(post_id=post_id).values_list(
+        'text', flat=True)
+    store(post_id, text, comments)
+
+
+def remove_post(post_id):
+    if use_fts():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id])
+    # Строки SearchTerm удаляются вместе с записью каскадом
+
+
+def rebuild(chunk_size=2000):
+    """
+    Собирает индекс заново по всем записям и возвращает их число.
+
+    Записи читаются пачками по chunk_size в порядке id, комментарии -
+    только к записям текущей пачки, по диапазону id.
+    """
+    if use_fts():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+    else:
+        SearchTerm.objects.all().delete()
+    posts = Post.objects.order_by('id').values_list(
+        'id', 'text').iterator(chunk_size)
+    indexed = 0
+    while True:
+        chunk = list(itertools.islice(posts, chunk_size))
+        if not chunk:
+            return indexed
+        comments = _comments(chunk[0][0], chunk[-1][0])
+        _insert_chunk(
+            (post_id, text, comments.get(post_id, ()))
+            for post_id, text in chunk)
+        indexed += len(chunk)
+
+
+def _comments(first_id, last_id):
+    comments = {}
+    for post_id, text in Comment.objects.filter(
+            post_id__gte=first_id, post_id__lte=last_id).values_list(
+            'post_id', 'text'):
+        comments.setdefault(post_id, []).append(text)
+    return comments
+
+
+def _insert_chunk(documents):
+    """
+    Добавляет документы в пустой индекс одной пачкой.
+    """
+    if use_fts():
+        rows = [(post_id, ' '.join(tokenize(text)),
+                 ' '.join(term for comment in post_comments
+                          for term in tokenize(comment)))
+                for post_id, text, post_comments in documents]
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, text, comments) '
+                f'VALUES (%s, %s, %s)', rows)
+        return
+    SearchTerm.objects.bulk_create(
+        SearchTerm(post_id=post_id, term=term, weight=weight)
+        for post_id, text, post_comments in documents
+        for term, weight in _weights(text, post_comments).items())
+
+
+class SearchResults:
+    """
+    Найденные записи в порядке релевантности.
+
+    Поддерживает count() и срезы, поэтому передается в Paginator как
+    обычный список: с базы читается только текущая страница.
+    """
+
+    def __init__(self, query):
+        self.terms = list(dict.fromkeys(tokenize(query)))
+
+    def count(self):
+        if not self.terms:
+            return 0
+        if use_fts():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'SELECT COUNT(*) FROM {FTS_TABLE} '
+                    f'WHERE {FTS_TABLE} MATCH %s', [self._match()])
+                return cursor.fetchone()[0]
+        return self._matching_terms().count()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        if not self.terms:
+            return []
+        start = index.start or 0
+        ids = self._ranked_ids(start, index.stop - start)
+        posts = Post.objects.for_feed().in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+    def _match(self):
+        return ' '.join(f'"{term}"' for term in self.terms)
+
+    def _matching_terms(self):
+        terms = [term[:64] for term in self.terms]
+        return SearchTerm.objects.filter(term__in=terms).values(
+            'post_id').annotate(matched=Count('term')).filter(
+            matched=len(self.terms))
+
+    def _ranked_ids(self, offset, limit):
+        if use_fts():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'SELECT rowid FROM {FTS_TABLE} '
+                    f'WHERE {FTS_TABLE} MATCH %s '
+                    f'ORDER BY bm25({FTS_TABLE}, {TEXT_WEIGHT}, 1), '
+                    f'rowid DESC '
+                    f'LIMIT %s OFFSET %s', [self._match(), limit, offset])
+                return [row[0] for row in cursor.fetchall()]
+        ranked = self._matching_terms().annotate(
+            score=Sum('weight')).order_by('-score', '-post_id')
+        return list(ranked.values_list(
+            'post_id', flat=True)[offset:offset + limit])
@@ -0,0 +1,202 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import search, timelines, versions
+from .models import Comment, Follow, Group, Post, Profile
+from .paginators import count_cache_key
+
+User = get_user_model()
+
+
+def change_profile(user_id, **deltas):
+    change_profiles([user_id], **deltas)
+
+
+def change_profiles(user_ids, **deltas):
+    Profile.objects.filter(user_id__in=user_ids).update(
+        **{name: Greatest(F(name) + delta, 0)
+           for name, delta in deltas.items()})
+
+
+def forget_counts(*feeds):
+    cache.delete_many([count_cache_key(feed) for feed in feeds])
+
+
+def forget_post_counts(post):
+    feeds = ['index', f'author:{post.author_id}']
+    if post.group_id is not None:
+        feeds.append(f'group:{post.group_id}')
+    forget_counts(*feeds)
+
+
+def bump_follow_pages(user_id, author_ids):
+    # На страницах обоих пользователей видны счетчики подписок
+    usernames = User.objects.filter(
+        id__in=[user_id, *author_ids]).values_list('username', flat=True)
+    versions.bump(*(versions.author_name(name) for name in usernames))
+
+
+def followed(user_id, author_ids):
+    """
+    Побочные эффекты новых подписок user_id на авторов author_ids.
+    """
+    change_profiles(author_ids, followers_count=1)
+    change_profile(user_id, following_count=len(author_ids))
+    for author_id in author_ids:
+        timelines.backfill(user_id, author_id)
+    forget_counts(f'follow:{user_id}')
+    bump_follow_pages(user_id, author_ids)
+
+
+def unfollowed(user_id, author_ids):
+    """
+    Побочные эффекты отписки user_id от авторов author_ids.
+    """
+    change_profiles(author_ids, followers_count=-1)
+    change_profile(user_id, following_count=-len(author_ids))
+    for author_id in author_ids:
+        timelines.remove(user_id, author_id)
+    forget_counts(f'follow:{user_id}')
+    bump_follow_pages(user_id, author_ids)
+
+
+@receiver(post_save, sender=User)
+def create_profile(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Profile.objects.get_or_create(user=instance)
+
+
+@receiver(pre_save, sender=User)
+def user_changing(sender, instance, raw=False, update_fields=None,
+                  **kwargs):
+    # Запомним прежнее имя: оно есть в карточках и адресах записей
+    if (instance.pk is not None and not raw
+            and (update_fields is None or 'username' in update_fields)):
+        instance.old_username = User.objects.filter(
+            pk=instance.pk).values_list('username', flat=True).first()
+
+
+@receiver(post_save, sender=User)
+def user_renamed(sender, instance, created, raw=False, **kwargs):
+    old_username = getattr(instance, 'old_username', None)
+    if created or raw or old_username in (None, instance.username):
+        return
+    posts = Post.objects.filter(author=instance)
+    posts.update(version=F('version') + 1)
+    names = {versions.INDEX, versions.author_name(old_username),
+             versions.author_name(instance.username)}
+    for post_id, slug in posts.values_list('id', 'group__slug'):
+        names.add(versions.post_name(post_id))
+        if slug is not None:
+            names.add(versions.group_name(slug))
+    versions.bump(*names)
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        change_profile(instance.author_id, posts_count=1)
+        followers = timelines.fan_out(instance)
+        # Ленты подписчиков знаменитостей не пишутся, и их число записей
+        # устаревает не дольше чем на POSTS_COUNT_CACHE_TIMEOUT
+        forget_post_counts(instance)
+        forget_counts(*(f'follow:{user_id}' for user_id in followers))
+
+
+@receiver(pre_save, sender=Post)
+def post_changing(sender, instance, raw=False, **kwargs):
+    # Запомним прежнюю группу: ее страницы тоже изменятся
+    if instance.pk is not None and not raw:
+        instance.old_group = Group.objects.filter(
+            posts=instance.pk).first()
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        old_group = getattr(instance, 'old_group', None)
+        search.index_post(instance.pk)
+        versions.bump(*versions.post_names(instance, old_group))
+        old_group_id = old_group.id if old_group is not None else None
+        if not created and old_group_id != instance.group_id:
+            forget_counts(*(f'group:{group_id}' for group_id
+                            in (old_group_id, instance.group_id)
+                            if group_id is not None))
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    change_profile(instance.author_id, posts_count=-1)
+    forget_post_counts(instance)
+    search.remove_post(instance.pk)
+    versions.bump(*versions.post_names(instance))
+
+
+def touch_group_posts(group):
+    """
+    Поднимает версии записей группы и возвращает имена страниц, где
+    видны их карточки.
+    """
+    group.posts.update(version=F('version') + 1)
+    names = {versions.INDEX, versions.group_name(group.slug)}
+    for post_id, username in group.posts.values_list(
+            'id', 'author__username'):
+        names.update((versions.post_name(post_id),
+                      versions.author_name(username)))
+    return names
+
+
+@receiver(post_save, sender=Group)
+def group_changed(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        versions.bump(*touch_group_posts(instance))
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleting(sender, instance, **kwargs):
+    # После удаления у записей group_id станет NULL (SET_NULL), и без
+    # сигналов записей их не найти: соберем страницы заранее
+    instance.stale_names = touch_group_posts(instance)
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    forget_counts(f'group:{instance.id}')
+    versions.bump(*getattr(instance, 'stale_names', ()))
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Post.objects.filter(pk=instance.post_id).update(
+            comment_count=F('comment_count') + 1, version=F('version') + 1)
+        search.index_post(instance.post_id)
+        versions.bump(*versions.post_names(instance.post))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    Post.objects.filter(pk=instance.post_id).update(
+        comment_count=Greatest(F('comment_count') - 1, 0),
+        version=F('version') + 1)
+    search.index_post(instance.post_id)
+    post = Post.objects.filter(pk=instance.post_id).select_related(
+        'author', 'group').first()
+    if post is not None:
+        versions.bump(*versions.post_names(post))
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        followed(instance.user_id, [instance.author_id])
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    unfollowed(instance.user_id, [instance.author_id])
@@ -0,0 +1,105 @@
+"""
+Стеммер русского языка по алгоритму Snowball (Портера).
+
+Поисковый индекс хранит основы слов, поэтому «записи», «записью» и
+«запись» находятся по любой из этих форм.
+"""
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND = (('в', 'вши', 'вшись'),
+                     ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'))
+REFLEXIVE = ((), ('ся', 'сь'))
+ADJECTIVE = ((), ('ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый',
+                  'ой', 'ем', 'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому',
+                  'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею'))
+PARTICIPLE = (('ем', 'нн', 'вш', 'ющ', 'щ'), ('ивш', 'ывш', 'ующ'))
+VERB = (('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но',
+         'ет', 'ют', 'ны', 'ть', 'ешь', 'нно'),
+        ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей',
+         'уй', 'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят',
+         'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'))
+NOUN = ((), ('а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи',
+             'ии', 'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием',
+             'ем', 'ам', 'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию',
+             'ью', 'ю', 'ия', 'ья', 'я'))
+SUPERLATIVE = ((), ('ейше', 'ейш'))
+DERIVATIONAL = ((), ('ость', 'ост'))
+
+
+def _regions(word):
+    """
+    Возвращает начала областей RV и R2 слова.
+    """
+    rv = next((i + 1 for i, char in enumerate(word) if char in VOWELS),
+              len(word))
+    r1 = _after_syllable(word, 0)
+    return rv, _after_syllable(word, r1)
+
+
+def _after_syllable(word, start):
+    for i in range(start + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            return i + 1
+    return len(word)
+
+
+def _strip(word, start, endings):
+    """
+    Отрезает самое длинное окончание из endings, лежащее правее start.
+
+    endings - пара групп: окончания первой группы отрезаются, только если
+    перед ними стоит «а» или «я».
+    """
+    after_a, plain = endings
+    candidates = [(ending, True) for ending in after_a]
+    candidates += [(ending, False) for ending in plain]
+    for ending, needs_a in sorted(candidates, key=lambda c: -len(c[0])):
+        cut = len(word) - len(ending)
+        if cut < start or not word.endswith(ending):
+            continue
+        if needs_a and (cut <= start or word[cut - 1] not in 'ая'):
+            continue
+        return word[:cut]
+    return None
+
+
+def _strip_inflection(word, rv):
+    stripped = _strip(word, rv, PERFECTIVE_GERUND)
+    if stripped is not None:
+        return stripped
+    # «ся» и «сь» отрезаются, только если перед ними окончание глагола
+    # или причастия: в «запись» и «рысь» это часть основы
+    unreflexive = _strip(word, rv, REFLEXIVE)
+    if unreflexive is not None:
+        stripped = _strip(unreflexive, rv, ADJECTIVE)
+        if stripped is not None:
+            return _strip(stripped, rv, PARTICIPLE) or stripped
+        stripped = _strip(unreflexive, rv, VERB)
+        if stripped is not None:
+            return stripped
+    stripped = _strip(word, rv, ADJECTIVE)
+    if stripped is not None:
+        return _strip(stripped, rv, PARTICIPLE) or stripped
+    for endings in (VERB, NOUN):
+        stripped = _strip(word, rv, endings)
+        if stripped is not None:
+            return stripped
+    return word
+
+
+def stem(word):
+    """
+    Возвращает основу слова в нижнем регистре.
+    """
+    word = word.lower().replace('ё', 'е')
+    rv, r2 = _regions(word)
+    word = _strip_inflection(word, rv)
+    if word.endswith('и') and len(word) > rv:
+        word = word[:-1]
+    word = _strip(word, r2, DERIVATIONAL) or word
+    word = _strip(word, rv, SUPERLATIVE) or word
+    if word.endswith('нн') and len(word) - 1 > rv:
+        return word[:-1]
+    if word.endswith('ь') and len(word) > rv:
+        return word[:-1]
+    return word
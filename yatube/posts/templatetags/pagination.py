@@ -0,0 +1,10 @@
+from django import template
+
+from ..paginators import page_window
+
+register = template.Library()
+
+
+@register.simple_tag
+def page_numbers(page):
+    return page_window(page)
@@ -0,0 +1,18 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from ..cards import card_data, render_card_list, render_cards
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, page):
+    return render_cards(page.object_list, context['user'])
+
+
+@register.simple_tag(takes_context=True)
+def post_card(context, post):
+    # На странице записи под карточкой уже есть форма комментария
+    card = card_data(post, context['user'], comment_link=False)
+    return mark_safe(render_card_list([card])[0])
@@ -5,7 +5,8 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
 from django.urls import reverse
 
 from ..forms import PostForm
@@ -167,3 +168,73 @@ class PostsFormTests(TestCase):
         self.assertRedirects(response, reverse(url))
         self.assertEqual(posts_count_after, posts_count_before + 1)
         self.assertTrue(get_new_post)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), POSTS_IMAGE_WORKERS=0)
+class ThumbnailPipelineTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='rodion')
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def tearDown(self):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+
+    def upload(self, name):
+        small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x01\x00'
+            b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+            b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+            b'\x00\x00\x01\x00\x01\x00\x00\x02'
+            b'\x02\x4c\x01\x00\x3b'
+        )
+        return SimpleUploadedFile(
+            name=name,
+            content=small_gif,
+            content_type='image/gif'
+        )
+
+    def test_thumbnail_is_prepared_after_upload(self):
+        """После загрузки картинки у записи появляется миниатюра,
+        и лента показывает ее."""
+        self.authorized_client.post(
+            reverse('new_post'),
+            data={'text': 'Текст', 'image': self.upload('small.gif')}
+        )
+        post = Post.objects.get()
+        self.assertTrue(post.thumbnail)
+        content = self.client.get(reverse('index')).content.decode()
+        self.assertIn(post.thumbnail, content)
+
+    def test_new_image_replaces_thumbnail(self):
+        """При замене картинки миниатюра готовится заново."""
+        self.authorized_client.post(
+            reverse('new_post'),
+            data={'text': 'Текст', 'image': self.upload('small.gif')}
+        )
+        old_thumbnail = Post.objects.get().thumbnail
+        post = Post.objects.get()
+        self.authorized_client.post(
+            reverse('post_edit', kwargs={'username': 'rodion',
+                                         'post_id': post.id}),
+            data={'text': 'Текст', 'image': self.upload('other.gif')}
+        )
+        post.refresh_from_db()
+        self.assertTrue(post.thumbnail)
+        self.assertNotEqual(post.thumbnail, old_thumbnail)
+
+    def test_responsive_sources_are_rendered(self):
+        """Для картинки готовятся копии в WebP, а лента выводит их
+        в теге <picture>."""
+        self.authorized_client.post(
+            reverse('new_post'),
+            data={'text': 'Текст', 'image': self.upload('small.gif')}
+        )
+        post = Post.objects.get()
+        types = [source['type'] for source in post.image_sources]
+        self.assertIn('image/webp', types)
+        content = self.client.get(reverse('index')).content.decode()
+        self.assertIn('<picture>', content)
+        for source in post.image_sources:
+            self.assertIn(source['srcset'], content)
@@ -1,7 +1,22 @@
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from io import StringIO
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, override_settings
+
+from yatube.queries import explain
 
-from ..models import Group, Post
+from .. import versions
+from ..management.bench import regressions
+from ..management.synthetic import Sizes, generate
+from ..models import Comment, Follow, Group, Post, Profile, TimelineEntry
+from ..paginators import NEXT, PREVIOUS, KeysetPaginator, make_cursor
+from ..timelines import Timeline
 
 User = get_user_model()
 
@@ -31,3 +46,291 @@ class PostsModelTests(TestCase):
         for model, value in models:
             with self.subTest(model=model):
                 self.assertEqual(value, str(model))
+
+    def test_stale_instance_gets_new_version(self):
+        """Сохранение экземпляра, прочитанного до комментария, дает
+        версию новее той, что выставил комментарий."""
+        stale = Post.objects.get(pk=self.post.pk)
+        Comment.objects.create(post=self.post, author=self.user, text='Ок')
+        commented = Post.objects.get(pk=self.post.pk).version
+        self.assertGreater(commented, stale.version)
+        stale.text = 'Новый текст'
+        stale.save()
+        self.assertEqual(stale.version, commented + 1)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).version,
+                         commented + 1)
+
+    def test_stale_instance_keeps_comment_count(self):
+        """Сохранение экземпляра, прочитанного до комментария, не
+        затирает счетчик комментариев."""
+        stale = Post.objects.get(pk=self.post.pk)
+        Comment.objects.create(post=self.post, author=self.user, text='Ок')
+        stale.text = 'Новый текст'
+        stale.save()
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual((post.text, post.comment_count), ('Новый текст', 1))
+
+
+class ProfileCountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='rodion')
+        cls.author = User.objects.create(username='dicaprio')
+
+    def counters(self, user):
+        profile = Profile.objects.get(user=user)
+        return (profile.posts_count, profile.followers_count,
+                profile.following_count)
+
+    def test_counters_follow_writes_and_deletes(self):
+        """Счетчики обновляются при создании и удалении объектов."""
+        post = Post.objects.create(text='Текст', author=self.author)
+        follow = Follow.objects.create(user=self.user, author=self.author)
+        Comment.objects.create(post=post, author=self.user, text='Ок')
+        comment = Comment.objects.create(post=post, author=self.user,
+                                         text='Еще')
+        self.assertEqual(self.counters(self.author), (1, 1, 0))
+        self.assertEqual(self.counters(self.user), (0, 0, 1))
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 2)
+        comment.delete()
+        follow.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(self.counters(self.user), (0, 0, 0))
+        post.delete()
+        self.assertEqual(self.counters(self.author), (0, 0, 0))
+
+    def test_rebuild_counters_restores_values(self):
+        """Команда rebuild_counters пересчитывает счетчики по базе."""
+        post = Post.objects.create(text='Текст', author=self.author)
+        Comment.objects.create(post=post, author=self.user, text='Ок')
+        Follow.objects.create(user=self.user, author=self.author)
+        Profile.objects.update(posts_count=0, followers_count=0,
+                               following_count=5)
+        Post.objects.update(comment_count=0)
+        Profile.objects.filter(user=self.user).delete()
+        version = Post.objects.get(pk=post.pk).version
+        pages = (versions.post_name(post.pk), versions.author_name('rodion'))
+        before = versions.current(pages)[0]
+        call_command('rebuild_counters', stdout=StringIO())
+        self.assertEqual(self.counters(self.author), (1, 1, 0))
+        self.assertEqual(self.counters(self.user), (0, 0, 1))
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        # Закэшированные карточка и страницы со старыми счетчиками
+        # больше не отдаются
+        self.assertEqual(post.version, version + 1)
+        self.assertNotEqual(versions.current(pages)[0], before)
+
+    def test_rebuild_counters_keeps_correct_rows(self):
+        """Записи с верными счетчиками rebuild_counters не трогает."""
+        post = Post.objects.create(text='Текст', author=self.author)
+        version = Post.objects.get(pk=post.pk).version
+        call_command('rebuild_counters', stdout=StringIO())
+        self.assertEqual(Post.objects.get(pk=post.pk).version, version)
+
+
+class FeedIndexesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='rodion')
+        cls.group = Group.objects.create(
+            title='Название',
+            slug='slug',
+            description='Описание',
+        )
+        cls.post = Post.objects.create(
+            text='Текст',
+            author=cls.user,
+            group=cls.group,
+        )
+
+    def query_plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def test_feed_queries_are_sorted_by_index(self):
+        """Первые страницы лент читают диапазон индекса, а не сортируют во
+        временном B-дереве; полный проход есть только у главной, и его
+        обрывает LIMIT."""
+        if connection.vendor != 'sqlite':
+            self.skipTest('План запроса проверяется только на SQLite')
+        feeds = (
+            ('index', Post.objects.for_feed(), 'post_date_idx'),
+            ('group', self.group.posts.for_feed(), None),
+            ('profile', self.user.posts.for_feed(), None),
+            ('previous', Post.objects.for_feed().order_by('pub_date', 'id'),
+             'post_date_idx'),
+            ('comments', self.post.comments.select_related('author'), None),
+        )
+        for name, queryset, walked_index in feeds:
+            with self.subTest(feed=name):
+                plan = self.query_plan(queryset[:10])
+                self.assertEqual(
+                    [step for step in plan if step.startswith('SCAN')],
+                    [f'SCAN posts_post USING INDEX {walked_index}']
+                    if walked_index else [])
+                self.assertNotIn('TEMP B-TREE', ' '.join(plan))
+
+    @contextmanager
+    def assert_no_scans(self):
+        # Планы строятся с параметрами: с подставленными в текст
+        # значениями SQLite выбирает другой план
+        statements = []
+
+        def record(execute, sql, params, many, context):
+            statements.append((sql, params))
+            return execute(sql, params, many, context)
+
+        plans = []
+        with connection.execute_wrapper(record):
+            yield plans
+        for sql, params in statements:
+            with self.subTest(sql=sql):
+                plan = explain(connection, sql, params)
+                self.assertNotIn(' SCAN ', plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+                plans.append(plan)
+
+    def test_keyset_pages_seek_by_index(self):
+        """Страницы по курсору читаются диапазонами по индексу, без
+        прохода индекса от начала ленты."""
+        if connection.vendor != 'sqlite':
+            self.skipTest('План запроса проверяется только на SQLite')
+        feeds = (
+            ('index', Post.objects.for_feed()),
+            ('group', self.group.posts.for_feed()),
+            ('profile', self.user.posts.for_feed()),
+        )
+        for name, queryset in feeds:
+            for direction in (NEXT, PREVIOUS):
+                cursor = make_cursor(self.post, direction)
+                with self.subTest(feed=name, direction=direction):
+                    with self.assert_no_scans() as plans:
+                        KeysetPaginator(queryset, 10).get_page(cursor)
+                    # Диапазон по дате, а не проход всех записей автора
+                    # или группы
+                    for plan in plans:
+                        self.assertRegex(
+                            plan, r'SEARCH posts_post .*pub_date[<>=]')
+
+    @override_settings(POSTS_FANOUT_FOLLOWERS_LIMIT=0)
+    def test_follow_feed_reads_timeline_by_index(self):
+        """Лента подписок и записи популярных авторов читаются по
+        индексам, без полного просмотра таблиц и сортировки во временном
+        B-дереве."""
+        if connection.vendor != 'sqlite':
+            self.skipTest('План запроса проверяется только на SQLite')
+        author = User.objects.create(username='dicaprio')
+        Post.objects.create(text='Текст', author=author)
+        Follow.objects.create(user=self.user, author=author)
+        with self.assert_no_scans():
+            self.assertEqual(len(Timeline(self.user)[0:10]), 1)
+
+    def test_follow_is_unique(self):
+        """Повторная подписка на того же автора запрещена в базе."""
+        author = User.objects.create(username='dicaprio')
+        Follow.objects.create(user=self.user, author=author)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=self.user, author=author)
+
+
+class DataTransferTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        reader = User.objects.create(username='reader')
+        author = User.objects.create(username='author')
+        group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        self.post = Post.objects.create(
+            text='Запись', author=author, group=group)
+        Comment.objects.create(post=self.post, author=reader, text='Ответ')
+        Follow.objects.create(user=reader, author=author)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def transfer(self, data_format):
+        models = ('group', 'post', 'comment', 'follow')
+        paths = {name: os.path.join(self.directory, f'{name}.{data_format}')
+                 for name in models}
+        for name in models:
+            call_command('export_data', name, output=paths[name],
+                         format=data_format, stderr=StringIO())
+        pub_date = self.post.pub_date
+        Post.objects.all().delete()
+        Group.objects.all().delete()
+        Follow.objects.all().delete()
+        User.objects.all().delete()
+        for name in models:
+            call_command('import_data', name, paths[name],
+                         format=data_format, create_users=True,
+                         stdout=StringIO(), stderr=StringIO())
+        post = Post.objects.select_related('author', 'group').get()
+        self.assertEqual((post.id, post.text, post.pub_date),
+                         (self.post.id, 'Запись', pub_date))
+        self.assertEqual((post.author.username, post.group.slug),
+                         ('author', 'group'))
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(Comment.objects.get().author.username, 'reader')
+        reader = User.objects.get(username='reader')
+        self.assertTrue(Follow.objects.filter(
+            user=reader, author=post.author).exists())
+        self.assertEqual(reader.profile.following_count, 1)
+        self.assertTrue(TimelineEntry.objects.filter(user=reader).exists())
+
+    def test_created_users_get_profiles(self):
+        """Пользователи, созданные при загрузке, получают профиль и без
+        пересчета счетчиков."""
+        path = os.path.join(self.directory, 'post.ndjson')
+        call_command('export_data', 'post', output=path, stderr=StringIO())
+        Post.objects.all().delete()
+        User.objects.filter(username='author').delete()
+        call_command('import_data', 'post', path, create_users=True,
+                     skip_rebuild=True, stdout=StringIO(), stderr=StringIO())
+        self.assertTrue(Profile.objects.filter(
+            user__username='author').exists())
+
+    def test_ndjson_round_trip(self):
+        """Выгрузка в NDJSON и загрузка обратно сохраняют данные и
+        пересчитывают производные."""
+        self.transfer('ndjson')
+
+    def test_csv_round_trip(self):
+        """То же для CSV."""
+        self.transfer('csv')
+
+
+class SyntheticDataTests(TestCase):
+    def test_generator_fills_tables_with_power_law_follows(self):
+        """Генератор создает заданное число строк, а подписчиков больше
+        у первых по популярности авторов."""
+        users = generate(Sizes(users=50, posts=200, groups=3, comments=300,
+                               follows=5), stdout=StringIO())
+        self.assertEqual(len(users), 50)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 300)
+        self.assertEqual(Group.objects.count(), 3)
+        profiles = Profile.objects.filter(user_id__in=(users[0], users[-1]))
+        top, last = profiles.order_by('user_id').values_list(
+            'followers_count', flat=True)
+        self.assertGreater(top, last)
+        self.assertEqual(Post.objects.filter(author_id=users[0]).count(),
+                         Profile.objects.get(user_id=users[0]).posts_count)
+
+    def test_regressions_compare_p95_and_queries(self):
+        """Регрессией считается рост p95 выше порога и рост числа
+        запросов к базе."""
+        baseline = {'index': {'p95': 10, 'queries': 2},
+                    'post': {'p95': 10, 'queries': 3}}
+        results = {'index': {'p95': 11, 'queries': 2},
+                   'post': {'p95': 13, 'queries': 4},
+                   'search': {'p95': 50, 'queries': 9}}
+        self.assertEqual(regressions(baseline, results, 0.2),
+                         ['post: p95 10.00 -> 13.00 мс',
+                          'post: запросов 3 -> 4'])
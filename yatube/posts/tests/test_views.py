@@ -1,15 +1,29 @@
 import shutil
 import tempfile
+from io import StringIO
+from unittest import mock
 
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.paginator import Page, Paginator
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from ..models import Comment, Follow, Group, Post
+from yatube.queries import assert_no_repeated_queries
+
+from .. import page_cache, timelines
+from ..cards import card_key
+from ..models import (Comment, Follow, Group, Post, Profile,
+                      TimelineEntry)
+from ..paginators import page_window
+from ..stemmer import stem
 
 User = get_user_model()
 
@@ -134,11 +148,10 @@ class PostsViewTests(TestCase):
             reverse('post', kwargs={'username': 'rodion', 'post_id': 1}))
         post = response.context['post']
         author = response.context['author']
-        paginator = response.context['paginator'].count
-        count = Post.objects.all().count()
+        count = Post.objects.filter(author=author).count()
         PostsViewTests.post_context(self, post)
         PostsViewTests.author_context(self, author)
-        self.assertEqual(paginator, count)
+        self.assertEqual(author.profile.posts_count, count)
 
     def test_new_group_post_shows_at_index_and_group_pages(self):
         """При создании поста с указанием группы, этот пост появляется
@@ -160,20 +173,63 @@ class PostsViewTests(TestCase):
             kwargs={'slug': 'test_another_slug'})).context['page']
         self.assertNotIn(self.post, response)
 
+    @override_settings(POSTS_PAGE_CACHE_TIMEOUT=0)
     def test_index_page_cache_works_correctly(self):
-        """Кэширование главной страницы работает корректно."""
-        content = self.guest_client.get(reverse('index')).content
-        Post.objects.create(
+        """Карточки записей кэшируются, а изменения видны сразу."""
+        self.guest_client.get(reverse('index'))
+        key = card_key(self.post, AnonymousUser())
+        self.assertIsNotNone(cache.get(key))
+        cache.set(key, 'Карточка из кэша')
+        content = self.guest_client.get(reverse('index')).content.decode()
+        self.assertIn('Карточка из кэша', content)
+        new_post = Post.objects.create(
             text='Другой текст',
             author=self.user,
             group=self.group,
             image=self.uploaded
         )
-        cached_content = self.guest_client.get(reverse('index')).content
-        cache.clear()
-        refresh_content = self.guest_client.get(reverse('index')).content
-        self.assertEqual(content, cached_content)
-        self.assertNotEqual(cached_content, refresh_content)
+        content = self.guest_client.get(reverse('index')).content.decode()
+        self.assertIn(new_post.text, content)
+        self.post.text = 'Измененный текст'
+        self.post.save()
+        content = self.guest_client.get(reverse('index')).content.decode()
+        self.assertIn('Измененный текст', content)
+        self.assertNotIn('Карточка из кэша', content)
+
+    @override_settings(POSTS_PAGE_CACHE_TIMEOUT=0)
+    def test_renamed_author_gets_new_cards(self):
+        """После смены имени автора карточки его записей показывают
+        новое имя и новые адреса."""
+        self.post.refresh_from_db()
+        self.guest_client.get(reverse('index'))
+        self.assertIsNotNone(cache.get(card_key(self.post, AnonymousUser())))
+        author = User.objects.get(pk=self.user.pk)
+        author.username = 'renamed'
+        author.save()
+        content = self.guest_client.get(reverse('index')).content.decode()
+        self.assertIn('@renamed', content)
+        self.assertIn(reverse('post', args=('renamed', self.post.id)),
+                      content)
+        self.assertNotIn(reverse('profile', args=('rodion',)), content)
+
+    def test_post_card_links(self):
+        """Карточка ведет на автора, группу и запись, а кнопку
+        редактирования видит только автор."""
+        edit_url = reverse('post_edit', args=['rodion', self.post.id])
+        post_url = reverse('post', args=['rodion', self.post.id])
+        content = self.guest_client.get(reverse('index')).content.decode()
+        self.assertIn(f'href="{reverse("profile", args=["rodion"])}"',
+                      content)
+        self.assertIn(f'href="{reverse("group_posts", args=["test_slug"])}"',
+                      content)
+        self.assertIn(f'href="{post_url}"', content)
+        self.assertNotIn(edit_url, content)
+        content = self.authorized_client.get(
+            reverse('index')).content.decode()
+        self.assertIn(edit_url, content)
+        content = self.authorized_client.get(post_url).content.decode()
+        self.assertIn(edit_url, content)
+        self.assertNotIn(f'href="{post_url}"', content)
 
     def test_auth_user_can_follow(self):
         """Авторизованный пользователь может подписываться
@@ -292,6 +348,9 @@ class PaginatorViewTest(TestCase):
                 group=cls.group
             )
 
+    def setUp(self):
+        cache.clear()
+
     def test_first_page_contains_ten_records(self):
         """Paginator передает на первую страницу 10 записей."""
         pages = (
@@ -317,3 +376,760 @@ class PaginatorViewTest(TestCase):
                 response = self.client.get(page)
                 len_page = len(response.context['page'].object_list)
                 self.assertEqual(len_page, 3)
+
+    def test_profile_is_not_counted(self):
+        """Число записей профиля берется из счетчика, без COUNT(*)."""
+        with CaptureQueriesContext(connection) as queries:
+            page = self.client.get(
+                reverse('profile', args=['rodion']), {'page': 2}
+            ).context['page']
+        self.assertEqual(page.paginator.count, 13)
+        self.assertFalse(any('COUNT' in query['sql']
+                             for query in queries.captured_queries))
+
+    def test_cached_counts_follow_group_moves(self):
+        """Перенос записи в другую группу сразу меняет число записей
+        обеих групп."""
+        other = Group.objects.create(
+            title='Другая', slug='other', description='Описание')
+        for slug, count in (('test_slug', 13), ('other', 0)):
+            page = self.client.get(
+                reverse('group_posts', args=[slug])).context['page']
+            self.assertEqual(page.paginator.count, count)
+        post = Post.objects.filter(group=self.group).first()
+        post.group = other
+        post.save()
+        for slug, count in (('test_slug', 12), ('other', 1)):
+            with self.subTest(slug=slug):
+                page = self.client.get(
+                    reverse('group_posts', args=[slug])).context['page']
+                self.assertEqual(page.paginator.count, count)
+
+    def test_cached_follow_count_sees_new_posts(self):
+        """Новая запись автора сразу меняет число записей в лентах
+        подписок его подписчиков."""
+        reader = User.objects.create(username='reader')
+        Follow.objects.create(user=reader, author=self.user)
+        self.client.force_login(reader)
+        page = self.client.get(reverse('follow_index')).context['page']
+        self.assertEqual(page.paginator.count, 13)
+        Post.objects.create(text='Новый пост', author=self.user)
+        page = self.client.get(reverse('follow_index')).context['page']
+        self.assertEqual(page.paginator.count, 14)
+
+    def test_page_links_are_windowed(self):
+        """Ссылки есть только на страницы рядом с текущей и по краям."""
+        paginator = Paginator(range(1000), 10)
+        windows = (
+            (1, [1, 2, 3, None, 100]),
+            (5, [1, 2, 3, 4, 5, 6, 7, None, 100]),
+            (50, [1, None, 48, 49, 50, 51, 52, None, 100]),
+            (100, [1, None, 98, 99, 100]),
+        )
+        for number, window in windows:
+            with self.subTest(number=number):
+                self.assertEqual(page_window(paginator.page(number)), window)
+        self.assertEqual(page_window(Paginator(range(30), 10).page(2)),
+                         [1, 2, 3])
+
+
+@override_settings(POSTS_PAGINATION='has_next')
+class HasNextPaginatorViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create(username='rodion')
+        for i in range(13):
+            Post.objects.create(text=f'Пост {i}', author=user)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_pages_are_not_counted(self):
+        """Страницы выбираются с лишней записью вместо COUNT(*)."""
+        for number, size, has_next in ((1, 10, True), (2, 3, False)):
+            with self.subTest(number=number):
+                with CaptureQueriesContext(connection) as queries:
+                    page = self.client.get(
+                        reverse('index'), {'page': number}).context['page']
+                self.assertIs(type(page), Page)
+                self.assertEqual(len(page), size)
+                self.assertEqual(page.has_next(), has_next)
+                self.assertFalse(any('COUNT' in query['sql']
+                                     for query in queries.captured_queries))
+
+    def test_page_after_end_returns_first_page(self):
+        """Номер за концом ленты возвращает первую страницу."""
+        page = self.client.get(reverse('index'), {'page': 5}).context['page']
+        self.assertEqual(page.number, 1)
+        response = self.client.get(reverse('api_index'), {'page': 2})
+        self.assertNotIn('count', response.json())
+
+
+@override_settings(POSTS_PAGINATION='keyset')
+class KeysetPaginatorViewTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='rodion')
+        cls.group = Group.objects.create(
+            title='Название',
+            slug='test_slug',
+            description='Описание',
+        )
+        for i in range(13):
+            Post.objects.create(
+                text=f'Пост {i}',
+                author=cls.user,
+                group=cls.group
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cursor_pages_follow_each_other(self):
+        """Курсор ведет на следующую страницу и обратно без пропусков."""
+        pages = (
+            (reverse('index')),
+            (reverse('group_posts', kwargs={'slug': 'test_slug'})),
+            (reverse('profile', kwargs={'username': 'rodion'}))
+        )
+        for url in pages:
+            with self.subTest(url=url):
+                first = self.client.get(url).context['page']
+                self.assertEqual(len(first), 10)
+                self.assertFalse(first.has_previous())
+                second = self.client.get(
+                    url, {'cursor': first.next_cursor}).context['page']
+                self.assertEqual(len(second), 3)
+                self.assertFalse(second.has_next())
+                self.assertEqual(
+                    set(first) | set(second), set(Post.objects.all()))
+                back = self.client.get(
+                    url, {'cursor': second.previous_cursor}).context['page']
+                self.assertEqual(list(back), list(first))
+                self.assertFalse(back.has_previous())
+
+    def test_broken_cursor_returns_first_page(self):
+        """Некорректный курсор возвращает первую страницу."""
+        response = self.client.get(reverse('index'), {'cursor': 'broken'})
+        self.assertEqual(
+            list(response.context['page']),
+            list(Post.objects.order_by('-pub_date', '-id')[:10]))
+
+
+class FeedQueriesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='rodion')
+        cls.author = User.objects.create(username='dicaprio')
+        cls.group = Group.objects.create(
+            title='Название',
+            slug='test_slug',
+            description='Описание',
+        )
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def create_posts(self, count):
+        for i in range(count):
+            post = Post.objects.create(
+                text=f'Пост {i}',
+                author=self.author,
+                group=self.group
+            )
+            Comment.objects.create(
+                post=post, author=self.user, text='Комментарий')
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.authorized_client.get(url)
+        return len(queries)
+
+    def test_feed_queries_do_not_depend_on_page_size(self):
+        """Число запросов ленты не растет с числом записей на странице."""
+        urls = (
+            reverse('index'),
+            reverse('group_posts', kwargs={'slug': 'test_slug'}),
+            reverse('profile', kwargs={'username': 'dicaprio'}),
+            reverse('follow_index'),
+        )
+        self.create_posts(1)
+        one_post = {url: self.count_queries(url) for url in urls}
+        self.create_posts(9)
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), one_post[url])
+
+    def test_post_page_queries_do_not_depend_on_comments(self):
+        """Число запросов страницы записи не растет с числом комментариев."""
+        self.create_posts(1)
+        post = Post.objects.get()
+        url = reverse('post', kwargs={'username': 'dicaprio',
+                                      'post_id': post.id})
+        one_comment = self.count_queries(url)
+        for i in range(9):
+            Comment.objects.create(
+                post=post, author=self.author, text=f'Ответ {i}')
+        self.assertEqual(self.count_queries(url), one_comment)
+
+    def test_views_have_no_repeated_queries(self):
+        """Ни одна страница не делает запрос на каждую запись или
+        комментарий."""
+        self.create_posts(10)
+        post = Post.objects.first()
+        urls = (
+            reverse('index'),
+            reverse('group_posts', kwargs={'slug': 'test_slug'}),
+            reverse('profile', kwargs={'username': 'dicaprio'}),
+            reverse('follow_index'),
+            reverse('post', kwargs={'username': 'dicaprio',
+                                    'post_id': post.id}),
+            reverse('search') + '?q=Пост',
+            reverse('api_index'),
+            reverse('api_comments', kwargs={'post_id': post.id}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                cache.clear()
+                with assert_no_repeated_queries():
+                    self.authorized_client.get(url)
+
+    def test_author_is_loaded_with_follow_flag(self):
+        """Автор, его счетчики и признак подписки читаются одним запросом."""
+        self.create_posts(1)
+        post = Post.objects.get()
+        urls = (
+            reverse('profile', kwargs={'username': 'dicaprio'}),
+            reverse('post', kwargs={'username': 'dicaprio',
+                                    'post_id': post.id}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                cache.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.authorized_client.get(url)
+                self.assertTrue(response.context['is_following'])
+                separate = [query['sql'] for query in queries
+                            if 'posts_follow' in query['sql']
+                            and 'posts_profile' not in query['sql']]
+                self.assertEqual(separate, [])
+
+
+class TimelineViewTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='rodion')
+        cls.author = User.objects.create(username='dicaprio')
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def follow_page(self):
+        return list(self.authorized_client.get(
+            reverse('follow_index')).context['page'])
+
+    def test_follow_backfills_and_unfollow_clears_timeline(self):
+        """Подписка добавляет записи автора в ленту, отписка убирает их."""
+        old_post = Post.objects.create(text='Старый пост', author=self.author)
+        self.authorized_client.get(reverse(
+            'profile_follow', kwargs={'username': 'dicaprio'}))
+        new_post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(self.follow_page(), [new_post, old_post])
+        self.authorized_client.get(reverse(
+            'profile_unfollow', kwargs={'username': 'dicaprio'}))
+        self.assertFalse(TimelineEntry.objects.filter(user=self.user))
+        self.assertEqual(self.follow_page(), [])
+
+    @override_settings(POSTS_TIMELINE_LENGTH=2)
+    def test_timeline_is_trimmed_on_follow(self):
+        """При подписке лента обрезается до POSTS_TIMELINE_LENGTH записей."""
+        for i in range(3):
+            Post.objects.create(text=f'Пост {i}', author=self.author)
+        Follow.objects.create(user=self.user, author=self.author)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.user).count(), 2)
+
+    @override_settings(POSTS_TIMELINE_LENGTH=2)
+    def test_timeline_is_trimmed_on_fan_out(self):
+        """Новые записи вытесняют из ленты самые старые."""
+        Follow.objects.create(user=self.user, author=self.author)
+        posts = [Post.objects.create(text=f'Пост {i}', author=self.author)
+                 for i in range(3)]
+        self.assertEqual(
+            list(TimelineEntry.objects.filter(user=self.user).values_list(
+                'post_id', flat=True)), [posts[2].id, posts[1].id])
+
+    @override_settings(POSTS_TIMELINE_LENGTH=2)
+    def test_trim_deletes_only_entries_past_the_limit(self):
+        """Обрезка удаляет записи старше последней оставляемой, в том
+        числе с той же датой, и не трогает ленты короче лимита."""
+        posts = [Post.objects.create(text=f'Пост {i}', author=self.author)
+                 for i in range(3)]
+        TimelineEntry.objects.bulk_create(
+            TimelineEntry(user=self.user, post=post,
+                          pub_date=posts[0].pub_date)
+            for post in posts)
+        timelines.trim(self.user.id)
+        self.assertEqual(
+            list(TimelineEntry.objects.filter(user=self.user).order_by(
+                '-post_id').values_list('post_id', flat=True)),
+            [posts[2].id, posts[1].id])
+        with CaptureQueriesContext(connection) as queries:
+            timelines.trim(self.author.id)
+        self.assertFalse([query for query in queries.captured_queries
+                          if query['sql'].startswith('DELETE')])
+
+    @override_settings(POSTS_FANOUT_FOLLOWERS_LIMIT=1, POSTS_PER_PAGE=2)
+    def test_timeline_merges_celebrity_posts(self):
+        """Записи популярного автора встают в ленту по дате публикации
+        на всех страницах."""
+        celebrity = User.objects.create(username='celebrity')
+        Follow.objects.create(user=self.author, author=celebrity)
+        Follow.objects.create(user=self.user, author=celebrity)
+        Follow.objects.create(user=self.user, author=self.author)
+        posts = [Post.objects.create(text=f'Пост {i}', author=self.author)
+                 for i in range(3)]
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.user).count(), 3)
+        posts.insert(1, Post.objects.create(text='Пост', author=celebrity))
+        # Запись популярного автора с той же датой, что у записи из ленты
+        Post.objects.filter(id=posts[1].id).update(
+            pub_date=posts[0].pub_date)
+        expected = list(Post.objects.order_by('-pub_date', '-id'))
+        pages = [list(self.authorized_client.get(
+            reverse('follow_index'), {'page': number}).context['page'])
+            for number in (1, 2)]
+        self.assertEqual(pages[0] + pages[1], expected)
+
+    @override_settings(POSTS_PAGINATION='keyset', POSTS_PER_PAGE=2)
+    def test_timeline_cursor_pages(self):
+        """Курсор ведет по ленте подписок вперед и назад."""
+        Follow.objects.create(user=self.user, author=self.author)
+        posts = [Post.objects.create(text=f'Пост {i}', author=self.author)
+                 for i in range(3)][::-1]
+        url = reverse('follow_index')
+        first = self.authorized_client.get(url).context['page']
+        second = self.authorized_client.get(
+            url, {'cursor': first.next_cursor}).context['page']
+        self.assertEqual(list(first) + list(second), posts)
+        self.assertFalse(second.has_next())
+        back = self.authorized_client.get(
+            url, {'cursor': second.previous_cursor}).context['page']
+        self.assertEqual(list(back), posts[:2])
+
+    @override_settings(POSTS_FANOUT_FOLLOWERS_LIMIT=0)
+    def test_celebrity_posts_are_pulled_on_read(self):
+        """Записи популярного автора не раскладываются, а читаются из Post."""
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(text='Пост', author=self.author)
+        self.assertFalse(TimelineEntry.objects.filter(user=self.user))
+        self.assertEqual(self.follow_page(), [post])
+
+
+class SearchViewTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='rodion')
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, query):
+        response = self.client.get(reverse('search'), {'q': query})
+        return list(response.context['page'])
+
+    def check_search(self):
+        in_text = Post.objects.create(
+            text='Красивые фотографии моря', author=self.author)
+        in_comment = Post.objects.create(text='Отпуск', author=self.author)
+        Comment.objects.create(
+            post=in_comment, author=self.author, text='Какое красивое море!')
+        Post.objects.create(text='Горы', author=self.author)
+        self.assertEqual(self.search('красивое море'), [in_text, in_comment])
+        in_text.delete()
+        self.assertEqual(self.search('морем'), [in_comment])
+        in_comment.comments.all().delete()
+        self.assertEqual(self.search('морем'), [])
+
+    def test_search_finds_word_forms_in_posts_and_comments(self):
+        """Поиск находит формы слов в тексте записи и в комментариях,
+        совпадение в тексте записи выше."""
+        self.check_search()
+
+    @override_settings(POSTS_SEARCH_BACKEND='terms')
+    def test_search_without_fts5(self):
+        """Обратный индекс без FTS5 дает те же результаты."""
+        self.check_search()
+
+    def test_noun_ending_in_reflexive_suffix(self):
+        """«Запись» не теряет «сь» как возвратный глагол и находится по
+        любой своей форме."""
+        forms = ('запись', 'записи', 'записью')
+        self.assertEqual(len({stem(form) for form in forms}), 1)
+        posts = {form: Post.objects.create(text=f'Новая {form}',
+                                           author=self.author)
+                 for form in forms}
+        for backend in ('auto', 'terms'):
+            with override_settings(POSTS_SEARCH_BACKEND=backend):
+                call_command('rebuild_search_index', stdout=StringIO())
+                for form in forms:
+                    with self.subTest(backend=backend, form=form):
+                        self.assertCountEqual(self.search(form),
+                                              posts.values())
+
+    def test_search_pages_keep_query(self):
+        """Ссылки на страницы результатов сохраняют запрос."""
+        for i in range(settings.POSTS_PER_PAGE + 1):
+            Post.objects.create(text=f'Запись {i}', author=self.author)
+        response = self.client.get(reverse('search'), {'q': 'запись'})
+        self.assertEqual(response.context['page'].paginator.count,
+                         settings.POSTS_PER_PAGE + 1)
+        self.assertContains(
+            response, '?q=%D0%B7%D0%B0%D0%BF%D0%B8%D1%81%D1%8C&amp;page=2')
+
+
+class ApiViewTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='rodion')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-group',
+            description='Описание')
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            text='Текст', author=self.author, group=self.group)
+
+    def test_feeds_return_post_fields(self):
+        """Ленты отдают записи в JSON только с нужными полями."""
+        urls = (
+            reverse('api_index'),
+            reverse('api_group', kwargs={'slug': 'test-group'}),
+            reverse('api_profile', kwargs={'username': 'rodion'}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                results = self.client.get(url).json()['results']
+                self.assertEqual(len(results), 1)
+                self.assertEqual(results[0]['id'], self.post.id)
+                self.assertEqual(results[0]['author'], 'rodion')
+                self.assertEqual(results[0]['group'], 'test-group')
+        detail = self.client.get(
+            reverse('api_post', kwargs={'post_id': self.post.id})).json()
+        self.assertEqual(detail['text'], 'Текст')
+
+    def test_unchanged_feed_returns_not_modified(self):
+        """Повторный запрос с тем же ETag получает 304 без запросов к
+        базе, а новая запись меняет ETag."""
+        url = reverse('api_index')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Post.objects.create(text='Новая запись', author=self.author)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_comment_changes_post_etag(self):
+        """Новый комментарий меняет ETag записи и списка комментариев."""
+        urls = (
+            reverse('api_post', kwargs={'post_id': self.post.id}),
+            reverse('api_comments', kwargs={'post_id': self.post.id}),
+        )
+        etags = [self.client.get(url)['ETag'] for url in urls]
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Комментарий')
+        for url, etag in zip(urls, etags):
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+        comments = self.client.get(urls[1]).json()['results']
+        self.assertEqual(comments[0]['text'], 'Комментарий')
+
+    def test_follow_changes_profile_etag(self):
+        """Подписка меняет ETag ленты автора."""
+        url = reverse('api_profile', kwargs={'username': 'rodion'})
+        etag = self.client.get(url)['ETag']
+        reader = User.objects.create(username='reader')
+        Follow.objects.create(user=reader, author=self.author)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class ConditionalPageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='rodion')
+        cls.post = Post.objects.create(text='Текст', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_missing_pages_create_no_versions(self):
+        """Адреса несуществующих групп, авторов и записей не заводят
+        версий в кэше."""
+        urls = (
+            reverse('group_posts', kwargs={'slug': 'nothing'}),
+            reverse('profile', kwargs={'username': 'nobody'}),
+            reverse('post', kwargs={'username': 'rodion', 'post_id': 999}),
+            reverse('api_profile', kwargs={'username': 'nobody'}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 404)
+                self.assertFalse(response.has_header('ETag'))
+        names = ('group:nothing', 'author:nobody', 'post:999')
+        self.assertEqual(cache.get_many(
+            [f'{kind}:{name}' for name in names
+             for kind in ('version', 'modified')]), {})
+
+    def test_anonymous_pages_are_conditional(self):
+        """Аноним получает ETag, публичный Cache-Control и 304 на
+        повторный запрос."""
+        urls = (
+            reverse('index'),
+            reverse('profile', kwargs={'username': 'rodion'}),
+            reverse('post', kwargs={'username': 'rodion',
+                                    'post_id': self.post.id}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIn('public', response['Cache-Control'])
+                self.assertIn('Cookie', response['Vary'])
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(response.status_code, 304)
+
+    def test_authorized_pages_are_private(self):
+        """Страницы вошедшего пользователя не получают ETag."""
+        self.client.force_login(self.author)
+        response = self.client.get(reverse('index'))
+        self.assertIn('private', response['Cache-Control'])
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_comment_and_follow_change_post_page(self):
+        """Комментарий и подписка на автора меняют ETag страницы записи."""
+        url = reverse('post', kwargs={'username': 'rodion',
+                                      'post_id': self.post.id})
+        reader = User.objects.create(username='reader')
+        changes = (
+            lambda: Comment.objects.create(
+                post=self.post, author=reader, text='Комментарий'),
+            lambda: Follow.objects.create(user=reader, author=self.author),
+        )
+        for change in changes:
+            etag = self.client.get(url)['ETag']
+            change()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+
+
+class PageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='rodion')
+        cls.other = User.objects.create(username='dicaprio')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-group',
+            description='Описание')
+
+    def setUp(self):
+        cache.clear()
+        page_cache.reset()
+
+    def test_anonymous_page_is_served_from_cache(self):
+        """Повторный запрос анонима отдается из кэша без запросов к базе."""
+        Post.objects.create(text='Текст', author=self.author)
+        first = self.client.get(reverse('index'))
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse('index'))
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(page_cache.stats(), {'hits': 1, 'misses': 1})
+
+    def test_post_purges_only_affected_pages(self):
+        """Новая запись сбрасывает страницы своего автора и группы,
+        но не страницы другого автора."""
+        urls = {
+            'author': reverse('profile', kwargs={'username': 'rodion'}),
+            'group': reverse('group_posts', kwargs={'slug': 'test-group'}),
+            'other': reverse('profile', kwargs={'username': 'dicaprio'}),
+        }
+        for url in urls.values():
+            self.client.get(url)
+        Post.objects.create(
+            text='Новая запись', author=self.author, group=self.group)
+        for name, url in urls.items():
+            with self.subTest(page=name):
+                hits = page_cache.stats()['hits']
+                response = self.client.get(url)
+                self.assertEqual(page_cache.stats()['hits'] - hits,
+                                 1 if name == 'other' else 0)
+                if name != 'other':
+                    self.assertContains(response, 'Новая запись')
+
+    def test_group_delete_purges_cards_of_its_posts(self):
+        """После удаления группы карточки ее записей не ссылаются на
+        страницу группы."""
+        group = Group.objects.create(
+            title='Удаляемая группа', slug='doomed', description='Описание')
+        post = Post.objects.create(
+            text='Запись группы', author=self.author, group=group)
+        group_url = reverse('group_posts', kwargs={'slug': 'doomed'})
+        urls = [
+            reverse('index'),
+            reverse('profile', kwargs={'username': 'rodion'}),
+            reverse('post', kwargs={'username': 'rodion',
+                                    'post_id': post.id}),
+        ]
+        for url in urls:
+            self.assertContains(self.client.get(url), group_url)
+        group.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.version, 2)
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, 'Запись группы')
+                self.assertNotContains(response, group_url)
+
+    def test_authorized_pages_are_not_cached(self):
+        """Страницы вошедшего пользователя в кэш страниц не попадают."""
+        self.client.force_login(self.author)
+        self.client.get(reverse('index'))
+        self.assertEqual(page_cache.stats(), {'hits': 0, 'misses': 0})
+
+
+class MissingProfileTest(TestCase):
+    def test_pages_of_user_without_profile(self):
+        """Страницы пользователя без профиля (bulk_create, фикстура)
+        открываются, а профиль создается со счетчиками по базе."""
+        User.objects.bulk_create([User(username='bulk')])
+        author = User.objects.get(username='bulk')
+        post = Post.objects.create(text='Текст', author=author)
+        Follow.objects.create(
+            user=User.objects.create(username='reader'), author=author)
+        self.assertFalse(Profile.objects.filter(user=author).exists())
+        for url in (reverse('profile', args=('bulk',)),
+                    reverse('post', args=('bulk', post.id)),
+                    reverse('api_profile', args=('bulk',))):
+            with self.subTest(url=url):
+                cache.clear()
+                self.assertEqual(self.client.get(url).status_code, 200)
+        profile = Profile.objects.get(user=author)
+        self.assertEqual((profile.posts_count, profile.followers_count,
+                          profile.following_count), (1, 1, 0))
+
+
+class FollowWritesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='rodion')
+        cls.authors = [User.objects.create(username=f'author{i}')
+                       for i in range(3)]
+        for author in cls.authors:
+            Post.objects.create(text='Текст', author=author)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def follow(self, username):
+        return self.authorized_client.get(
+            reverse('profile_follow', kwargs={'username': username}))
+
+    def bulk(self, data):
+        return self.authorized_client.post(
+            reverse('follow_bulk'), data, content_type='application/json')
+
+    def test_repeated_follow_is_ignored(self):
+        """Повторная подписка не создает дубликат и не меняет счетчики."""
+        self.follow('author0')
+        self.follow('author0')
+        self.assertEqual(Follow.objects.filter(user=self.user).count(), 1)
+        self.user.profile.refresh_from_db()
+        self.assertEqual(self.user.profile.following_count, 1)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.user).count(), 1)
+
+    def test_follow_unknown_author_returns_404(self):
+        """Подписка на несуществующего автора возвращает 404."""
+        self.assertEqual(self.follow('nobody').status_code, 404)
+        response = self.authorized_client.get(
+            reverse('profile_unfollow', kwargs={'username': 'nobody'}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_follow_is_a_single_insert(self):
+        """Подписка - один INSERT без предварительной выборки автора."""
+        with CaptureQueriesContext(connection) as queries:
+            self.follow('author0')
+        writes = [query['sql'] for query in queries
+                  if 'posts_follow' in query['sql']]
+        self.assertTrue(writes[0].startswith('INSERT'))
+        self.assertEqual(len(writes), 1)
+
+    def test_bulk_follow_and_unfollow(self):
+        """Подписка и отписка списком обновляют подписки, счетчики
+        и ленту."""
+        response = self.bulk(
+            {'follow': ['author0', 'author1', 'author2', 'nobody', 'rodion']})
+        self.assertEqual(response.json(), {'followed': 3, 'unfollowed': 0})
+        response = self.bulk({'unfollow': ['author0', 'author1']})
+        self.assertEqual(response.json(), {'followed': 0, 'unfollowed': 2})
+        self.assertEqual(
+            list(Follow.objects.filter(user=self.user).values_list(
+                'author__username', flat=True)), ['author2'])
+        self.user.profile.refresh_from_db()
+        self.assertEqual(self.user.profile.following_count, 1)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.user).count(), 1)
+
+    def test_bulk_without_returning(self):
+        """На SQLite старше 3.35 подписки пишутся без RETURNING с тем же
+        результатом."""
+        with mock.patch('posts.follows._supports_returning',
+                        return_value=False):
+            with CaptureQueriesContext(connection) as queries:
+                self.bulk({'follow': ['author0', 'author1', 'nobody']})
+                response = self.bulk(
+                    {'follow': ['author0', 'author2', 'rodion'],
+                     'unfollow': ['author0', 'author1']})
+        self.assertEqual(response.json(), {'followed': 1, 'unfollowed': 2})
+        self.assertFalse(any('RETURNING' in query['sql']
+                             for query in queries))
+        self.assertEqual(
+            list(Follow.objects.filter(user=self.user).values_list(
+                'author__username', flat=True)), ['author2'])
+        self.user.profile.refresh_from_db()
+        self.assertEqual(self.user.profile.following_count, 1)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.user).count(), 1)
+
+    @override_settings(POSTS_FOLLOW_BULK_LIMIT=2)
+    def test_bulk_rejects_bad_requests(self):
+        """Некорректное тело и слишком длинный список отклоняются."""
+        for data in ('[1, 2]', {'follow': ['a', 'b', 'c']},
+                     {'follow': 'author0'}, {'unfollow': [1]},
+                     {'follow': None}, {'unfollow': {'author0': True}}):
+            with self.subTest(data=data):
+                self.assertEqual(self.bulk(data).status_code, 400)
@@ -0,0 +1,208 @@
+"""
+Ленты подписок, которые собираются при записи (fan-out on write).
+
+Новая запись раскладывается по лентам подписчиков автора, поэтому
+follow_index читает готовый диапазон по индексу (user, -pub_date, -post),
+а не соединяет Follow и Post. Записи авторов, у которых подписчиков
+больше POSTS_FANOUT_FOLLOWERS_LIMIT, не раскладываются: лента подмешивает
+их при чтении, читая столько же последних записей каждого такого автора
+по индексу (author, -pub_date, -id).
+"""
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.functional import cached_property
+
+from .models import Follow, Post, Profile, TimelineEntry
+
+
+def is_celebrity(author_id):
+    return Profile.objects.filter(
+        user_id=author_id,
+        followers_count__gt=settings.POSTS_FANOUT_FOLLOWERS_LIMIT,
+    ).exists()
+
+
+def fan_out(post):
+    """
+    Добавляет новую запись в ленты подписчиков автора и возвращает id
+    подписчиков, чьи ленты изменились.
+    """
+    if is_celebrity(post.author_id):
+        return []
+    followers = list(Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True))
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+         for user_id in followers),
+        ignore_conflicts=True,
+    )
+    trim(*followers)
+    return followers
+
+
+def backfill(user_id, author_id):
+    """
+    Добавляет в ленту последние записи автора, на которого подписались.
+    """
+    if is_celebrity(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date').values_list('id', 'pub_date')
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+         for post_id, pub_date in posts[:settings.POSTS_TIMELINE_LENGTH]),
+        ignore_conflicts=True,
+    )
+    trim(user_id)
+
+
+def remove(user_id, author_id):
+    """
+    Убирает из ленты записи автора, от которого отписались.
+    """
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id).delete()
+
+
+def trim(*user_ids):
+    """
+    Оставляет в лентах не больше POSTS_TIMELINE_LENGTH последних записей.
+
+    В каждой ленте по индексу находится первая лишняя запись, и удаляются
+    только она и более старые: лента читается не дальше лимита, а не
+    нумеруется целиком. fan_out обрезает ленты всех подписчиков автора,
+    поэтому запросы выполняются прямо на курсоре, без построения QuerySet.
+    """
+    if not user_ids:
+        return
+    quote = connection.ops.quote_name
+    table = quote(TimelineEntry._meta.db_table)
+    user, pub_date, post = (
+        quote(TimelineEntry._meta.get_field(name).column)
+        for name in ('user', 'pub_date', 'post'))
+    with connection.cursor() as cursor:
+        bounds = []
+        for user_id in user_ids:
+            cursor.execute(
+                f'SELECT {pub_date}, {post} FROM {table} WHERE {user} = %s '
+                f'ORDER BY {pub_date} DESC, {post} DESC LIMIT 1 OFFSET %s',
+                (user_id, settings.POSTS_TIMELINE_LENGTH))
+            row = cursor.fetchone()
+            if row is not None:
+                bounds.append((user_id, *row))
+        if not bounds:
+            return
+        # Два диапазона по индексу, как в _latest
+        cursor.executemany(
+            f'DELETE FROM {table} WHERE {user} = %s AND {pub_date} = %s '
+            f'AND {post} <= %s', bounds)
+        cursor.executemany(
+            f'DELETE FROM {table} WHERE {user} = %s AND {pub_date} < %s',
+            [(user_id, date) for user_id, date, _ in bounds])
+
+
+def _latest(queryset, post_field, limit, bound=None, newer=False):
+    """
+    Ключи (pub_date, id записи) последних limit строк queryset, идущих
+    после bound в порядке ленты, или перед ним, если newer.
+    """
+    order = ('pub_date', post_field) if newer else (
+        '-pub_date', f'-{post_field}')
+    queryset = queryset.order_by(*order).values_list('pub_date', post_field)
+    if bound is None:
+        return list(queryset[:limit])
+    pub_date, pk = bound
+    lookup = 'gt' if newer else 'lt'
+    # Два диапазона по индексу вместо OR, который индекс не использует
+    same_date = queryset.filter(
+        pub_date=pub_date, **{f'{post_field}__{lookup}': pk})
+    return [*same_date[:limit],
+            *queryset.filter(**{f'pub_date__{lookup}': pub_date})[:limit]]
+
+
+class Timeline:
+    """
+    Лента подписок: собранные заранее записи и записи популярных авторов.
+
+    Как SearchResults, поддерживает count() и срезы для Paginator, а для
+    KeysetPaginator - seek(). Каждый источник читается диапазоном по
+    индексу не длиннее запрошенного, источники сливаются в Python.
+    """
+
+    def __init__(self, user):
+        self.user_id = user.id
+
+    @cached_property
+    def celebrities(self):
+        return list(Follow.objects.filter(
+            user_id=self.user_id,
+            author__profile__followers_count__gt=(
+                settings.POSTS_FANOUT_FOLLOWERS_LIMIT),
+        ).values_list('author_id', flat=True))
+
+    def _sources(self):
+        yield TimelineEntry.objects.filter(user_id=self.user_id), 'post_id'
+        for author_id in self.celebrities:
+            yield Post.objects.filter(author_id=author_id), 'id'
+
+    def _keys(self, limit, bound=None, newer=False):
+        # Запись могла попасть в ленту до того, как автор стал популярным
+        keys = {key for queryset, post_field in self._sources()
+                for key in _latest(queryset, post_field, limit, bound,
+                                   newer)}
+        return sorted(keys, reverse=not newer)[:limit]
+
+    @staticmethod
+    def _posts(keys):
+        ids = [pk for _, pk in keys]
+        posts = Post.objects.for_feed().in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+    def count(self):
+        entries = TimelineEntry.objects.filter(user_id=self.user_id)
+        pulled = Post.objects.filter(author_id__in=self.celebrities).exclude(
+            timeline_entries__user_id=self.user_id)
+        return entries.count() + (pulled.count() if self.celebrities else 0)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start = index.start or 0
+        return self._posts(self._keys(index.stop)[start:])
+
+    def seek(self, bound, newer, limit):
+        """
+        limit записей старше bound или, если newer, новее его в порядке
+        от bound.
+        """
+        return self._posts(self._keys(limit, bound, newer))
+
+
+def rebuild(user_id):
+    """
+    Собирает ленту пользователя заново по его подпискам.
+
+    Последние записи всех авторов, кроме популярных, переносятся в ленту
+    одним INSERT ... SELECT, без выборки строк в Python.
+    """
+    authors = Follow.objects.filter(user_id=user_id).exclude(
+        author__profile__followers_count__gt=(
+            settings.POSTS_FANOUT_FOLLOWERS_LIMIT),
+    ).values('author_id')
+    posts = Post.objects.filter(author_id__in=authors).order_by(
+        '-pub_date', '-id').values_list('id', 'pub_date')
+    posts = posts[:settings.POSTS_TIMELINE_LENGTH]
+    sql, params = posts.query.sql_with_params()
+    quote = connection.ops.quote_name
+    columns = ', '.join(
+        quote(TimelineEntry._meta.get_field(name).column)
+        for name in ('user', 'post', 'pub_date'))
+    with transaction.atomic(), connection.cursor() as cursor:
+        TimelineEntry.objects.filter(user_id=user_id).delete()
+        cursor.execute(
+            f'INSERT INTO {quote(TimelineEntry._meta.db_table)} ({columns}) '
+            f'SELECT %s, entries.* FROM ({sql}) AS entries',
+            (user_id, *params))
@@ -1,6 +1,6 @@
 from django.urls import path
 
-from . import views
+from . import api, views
 
 
 urlpatterns = [
@@ -8,8 +8,20 @@ urlpatterns = [
     path('', views.index, name='index'),
     # Страница постов авторов, на которые подписан пользователь
     path('follow/', views.follow_index, name='follow_index'),
+    # Подписка и отписка списком авторов
+    path('follow/bulk/', views.follow_bulk, name='follow_bulk'),
     # Добавление новой публикации
     path('new/', views.new_post, name='new_post'),
+    # JSON API только для чтения
+    path('api/posts/', api.index, name='api_index'),
+    path('api/posts/<int:post_id>/', api.post_detail, name='api_post'),
+    path('api/posts/<int:post_id>/comments/', api.post_comments,
+         name='api_comments'),
+    path('api/groups/<slug>/posts/', api.group_posts, name='api_group'),
+    path('api/users/<str:username>/posts/', api.profile,
+         name='api_profile'),
+    # Поиск по записям и комментариям
+    path('search/', views.search, name='search'),
     # Страница группы
     path('group/<slug>/', views.group_posts, name='group_posts'),
     # Профайл пользователя
@@ -0,0 +1,189 @@
+"""
+Счетчики версий страниц для условных запросов.
+
+У каждой ленты и записи в кэше хранятся номер версии и время последнего
+изменения. Сигналы увеличивают версию при любом изменении, которое видно
+на странице, а представления строят по ним ETag и Last-Modified, не
+обращаясь к базе.
+"""
+import datetime as dt
+import functools
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.cache import (patch_cache_control, patch_vary_headers,
+                                quote_etag)
+from django.utils.http import http_date
+from django.views.decorators.http import condition
+
+from . import page_cache
+
+INDEX = 'index'
+# Версия, которую долго не меняли, заводится заново от текущего времени
+VERSION_TIMEOUT = 30 * 24 * 60 * 60
+
+
+def group_name(slug):
+    return f'group:{slug}'
+
+
+def author_name(username):
+    return f'author:{username}'
+
+
+def post_name(post_id):
+    return f'post:{post_id}'
+
+
+def post_names(post, group=None):
+    """
+    Страницы, на которых видна запись.
+    """
+    names = [INDEX, author_name(post.author.username), post_name(post.pk)]
+    for item in (post.group, group):
+        if item is not None:
+            names.append(group_name(item.slug))
+    return names
+
+
+def bump(*names):
+    now = time.time()
+    for name in names:
+        try:
+            cache.incr(f'version:{name}')
+        except ValueError:
+            cache.add(f'version:{name}', time.time_ns() // 1000,
+                      VERSION_TIMEOUT)
+    cache.set_many({f'modified:{name}': now for name in names},
+                   VERSION_TIMEOUT)
+
+
+def current(names):
+    """
+    Возвращает строку версий и время последнего изменения страниц names.
+
+    Если версии нет в кэше (страницу еще не меняли или кэш очистили),
+    возвращается (None, None) и в кэш ничего не пишется: иначе каждый
+    адрес с несуществующим slug, именем или id заводил бы ключ на
+    VERSION_TIMEOUT. Такая страница отдается без ETag и мимо кэша
+    страниц, а версии заводит seed после успешного ответа.
+    """
+    keys = [f'{kind}:{name}' for name in names
+            for kind in ('version', 'modified')]
+    stored = cache.get_many(keys)
+    if len(stored) < len(keys):
+        return None, None
+    versions = '-'.join(str(stored[f'version:{name}']) for name in names)
+    modified = max(stored[f'modified:{name}'] for name in names)
+    return versions, dt.datetime.fromtimestamp(modified, timezone.utc)
+
+
+def seed(names):
+    """
+    Заводит недостающие версии страниц names от текущего времени, чтобы
+    они не совпали с уже выданными ETag.
+    """
+    keys = [f'{kind}:{name}' for name in names
+            for kind in ('version', 'modified')]
+    stored = cache.get_many(keys)
+    bump(*(name for name in names if f'version:{name}' not in stored
+           or f'modified:{name}' not in stored))
+
+
+def page_versions(request, names_func, *args, **kwargs):
+    """
+    Версии страницы запроса; считаются один раз на запрос.
+
+    names_func(request, *args, **kwargs) возвращает имена версий страницы.
+    """
+    if not hasattr(request, '_page_versions'):
+        names = names_func(request, *args, **kwargs)
+        request._page_versions = current(names)
+    return request._page_versions
+
+
+def settle_versions(request, names_func, *args, **kwargs):
+    """
+    Версии страницы, которую представление успешно отдало: недостающие
+    заводятся, раз страница существует.
+    """
+    if page_versions(request, names_func, *args, **kwargs)[0] is None:
+        names = names_func(request, *args, **kwargs)
+        seed(names)
+        request._page_versions = current(names)
+    return request._page_versions
+
+
+def etag_for(request, versions):
+    raw = f'{request.get_full_path()}|{versions}'
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def conditional(names_func):
+    """
+    Отвечает 304 на повторный запрос страницы, версии которой не
+    изменились, до вызова представления.
+
+    Страница без заведенных версий отдается целиком; ETag и
+    Last-Modified она получает после того, как версии заведены.
+    """
+    def etag(request, *args, **kwargs):
+        versions = page_versions(request, names_func, *args, **kwargs)[0]
+        return None if versions is None else etag_for(request, versions)
+
+    def last_modified(request, *args, **kwargs):
+        return page_versions(request, names_func, *args, **kwargs)[1]
+
+    def decorator(view):
+        conditional_view = condition(
+            etag_func=etag, last_modified_func=last_modified)(view)
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.has_header(
+                    'ETag'):
+                versions, modified = settle_versions(
+                    request, names_func, *args, **kwargs)
+                response['ETag'] = quote_etag(etag_for(request, versions))
+                response['Last-Modified'] = http_date(modified.timestamp())
+            return response
+        return wrapper
+    return decorator
+
+
+def public_page(names_func):
+    """
+    Условные ответы, кэш страниц и Cache-Control для анонимных посетителей.
+
+    Анониму отдаются ETag и Last-Modified по версиям names_func и
+    заголовки, с которыми страницу может хранить обратный прокси, а сама
+    страница берется из кэша целых страниц. Страницы вошедших
+    пользователей зависят от пользователя и помечаются private.
+    """
+    def decorator(view):
+        cached_view = page_cache.cache_page(
+            view,
+            lambda request, *args, **kwargs: page_versions(
+                request, names_func, *args, **kwargs)[0],
+            lambda request, *args, **kwargs: settle_versions(
+                request, names_func, *args, **kwargs)[0])
+        conditional_view = conditional(names_func)(cached_view)
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.user.is_authenticated:
+                response = view(request, *args, **kwargs)
+                patch_cache_control(response, private=True)
+            else:
+                response = conditional_view(request, *args, **kwargs)
+                patch_cache_control(
+                    response, public=True,
+                    max_age=settings.POSTS_PUBLIC_PAGE_MAX_AGE)
+            patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapper
+    return decorator
@@ -1,46 +1,77 @@
+import json
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.db.models import Exists, OuterRef
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.http import require_GET
+from django.views.decorators.http import require_GET, require_POST
+
+from yatube.sqlite import serialize_writes
 
+from . import follows, versions
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post
+from .images import schedule_image
+from .models import Follow, Group, Post, Profile
+from .paginators import paginate
+from .search import SearchResults
+from .timelines import Timeline
 
 User = get_user_model()
 
 
+def get_author(request, username):
+    """
+    Автор со счетчиками и признаком подписки текущего пользователя,
+    одним запросом вместо трех. Недостающий профиль создается.
+    """
+    authors = User.objects.select_related('profile').annotate(
+        is_following=Exists(Follow.objects.filter(
+            user=request.user.id, author=OuterRef('pk'))))
+    author = get_object_or_404(authors, username=username)
+    Profile.objects.for_user(author)
+    return author
+
+
 @require_GET
+@versions.public_page(lambda request: [versions.INDEX])
 def index(request):
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    post_list = Post.objects.for_feed()
+    page = paginate(request, post_list, 'index')
     return render(request, 'posts/index.html', {'page': page})
 
 
 @require_GET
+@versions.public_page(lambda request, slug: [versions.group_name(slug)])
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    post_list = group.posts.for_feed()
+    page = paginate(request, post_list, f'group:{group.id}')
     return render(request, 'posts/group.html', {'group': group, 'page': page})
 
 
 @require_GET
+def search(request):
+    query = request.GET.get('q', '').strip()
+    paginator = Paginator(SearchResults(query), settings.POSTS_PER_PAGE)
+    page = paginator.get_page(request.GET.get('page'))
+    return render(request, 'posts/search.html',
+                  {'query': query, 'page': page})
+
+
+@require_GET
+@versions.public_page(
+    lambda request, username: [versions.author_name(username)])
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    is_following = Follow.objects.filter(
-        user=request.user.id,
-        author=author)
-    follower = author.follower.count()
-    following = author.following.count()
+    author = get_author(request, username)
+    post_list = author.posts.for_feed()
+    page = paginate(request, post_list, f'author:{author.id}',
+                    author.profile.posts_count)
+    is_following = author.is_following
+    follower = author.profile.following_count
+    following = author.profile.followers_count
     return render(request, 'posts/profile.html',
                   {'author': author, 'page': page,
                    'is_following': is_following, 'user': request.user,
@@ -48,26 +79,26 @@ def profile(request, username):
 
 
 @require_GET
+@versions.public_page(
+    lambda request, username, post_id: [versions.post_name(post_id),
+                                        versions.author_name(username)])
 def post_view(request, username, post_id):
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
-    post = get_object_or_404(Post, id=post_id)
-    comments = post.comments.all()
-    paginator = Paginator(post_list, 10)
+    author = get_author(request, username)
+    post = get_object_or_404(Post.objects.for_feed(), id=post_id)
+    comments = post.comments.select_related('author')
     form = CommentForm(request.POST or None)
-    is_following = Follow.objects.filter(
-        user=request.user.id,
-        author=author)
-    follower = author.follower.count()
-    following = author.following.count()
+    is_following = author.is_following
+    follower = author.profile.following_count
+    following = author.profile.followers_count
     return render(request, 'posts/post.html',
-                  {'author': author, 'post': post, 'paginator': paginator,
+                  {'author': author, 'post': post,
                    'comments': comments, 'form': form,
                    'is_following': is_following, 'user': request.user,
                    'follower': follower, 'following': following})
 
 
 @login_required
+@serialize_writes
 def new_post(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
     if not form.is_valid():
@@ -75,10 +106,13 @@ def new_post(request):
     post = form.save(commit=False)
     post.author = request.user
     post.save()
+    if post.image:
+        schedule_image(post)
     return redirect('index')
 
 
 @login_required
+@serialize_writes
 def post_edit(request, username, post_id):
     user = get_object_or_404(User, username=username)
     post = get_object_or_404(Post, id=post_id, author_id=user)
@@ -87,12 +121,18 @@ def post_edit(request, username, post_id):
     if post.author != request.user:
         return redirect('post', username, post_id)
     if form.is_valid():
-        form.save()
+        post = form.save(commit=False)
+        if 'image' in form.changed_data:
+            post.thumbnail = post.derivatives = ''
+        post.save()
+        if 'image' in form.changed_data and post.image:
+            schedule_image(post)
         return redirect('post', username, post_id)
     return render(request, 'posts/new_post.html', {'form': form, 'post': post})
 
 
 @login_required
+@serialize_writes
 def add_comment(request, username, post_id):
     post = get_object_or_404(Post, id=post_id)
     form = CommentForm(request.POST or None)
@@ -106,24 +146,51 @@ def add_comment(request, username, post_id):
 
 @login_required
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    page = paginate(request, Timeline(request.user),
+                    f'follow:{request.user.id}')
     return render(request, 'posts/follow.html', {'page': page})
 
 
 @login_required
+@serialize_writes
 def profile_follow(request, username):
-    author = get_object_or_404(User, username=username)
-    if request.user != author:
-        Follow.objects.get_or_create(user=request.user, author=author)
+    # Автор ищется отдельно, только если подписка не добавилась
+    if not follows.follow(request.user, [username]):
+        get_object_or_404(User, username=username)
     return redirect('profile', username)
 
 
 @login_required
+@serialize_writes
 def profile_unfollow(request, username):
-    author = get_object_or_404(User, username=username)
-    if request.user != author:
-        Follow.objects.filter(user=request.user, author=author).delete()
+    if not follows.unfollow(request.user, [username]):
+        get_object_or_404(User, username=username)
     return redirect('profile', username)
+
+
+@login_required
+@require_POST
+@serialize_writes
+def follow_bulk(request):
+    """
+    Подписка и отписка списками имен авторов, например при импорте
+    подписок. Тело запроса: {"follow": [...], "unfollow": [...]}.
+    """
+    try:
+        data = json.loads(request.body)
+        to_follow = data.get('follow', [])
+        to_unfollow = data.get('unfollow', [])
+    except (AttributeError, ValueError):
+        to_follow = to_unfollow = None
+    if not all(isinstance(names, list)
+               and all(isinstance(name, str) for name in names)
+               for names in (to_follow, to_unfollow)):
+        return JsonResponse({'error': 'Ожидается JSON-объект со списками '
+                                      'строк follow и unfollow'}, status=400)
+    if len(to_follow) + len(to_unfollow) > settings.POSTS_FOLLOW_BULK_LIMIT:
+        return JsonResponse({'error': 'Слишком много авторов в запросе'},
+                            status=400)
+    return JsonResponse({
+        'followed': len(follows.follow(request.user, to_follow)),
+        'unfollowed': len(follows.unfollow(request.user, to_unfollow)),
+    })
@@ -0,0 +1,45 @@
+"""
+ASGI config for yatube project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+try:
+    from django.core.asgi import get_asgi_application
+except ImportError:
+    # В Django 2.2 нет ASGI-обработчика: WSGI-приложение обслуживается
+    # через адаптер asgiref, а цикл событий тем временем принимает
+    # новые соединения
+    from asgiref.sync import sync_to_async
+    from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+    from django.conf import settings
+    from django.core.wsgi import get_wsgi_application
+
+    wsgi_application = get_wsgi_application()
+    executor = ThreadPoolExecutor(settings.ASGI_THREADS)
+
+    class ThreadPoolInstance(WsgiToAsgiInstance):
+        # По умолчанию адаптер выполняет все запросы в одном потоке
+        run_wsgi_app = sync_to_async(
+            WsgiToAsgiInstance.__dict__['run_wsgi_app'].func,
+            thread_sensitive=False, executor=executor)
+
+    class ThreadPoolWsgiToAsgi(WsgiToAsgi):
+        async def __call__(self, scope, receive, send):
+            await ThreadPoolInstance(
+                self.wsgi_application, self.duplicate_header_limit)(
+                scope, receive, send)
+
+    application = ThreadPoolWsgiToAsgi(wsgi_application)
+else:
+    application = get_asgi_application()
+
+# Шаблоны компилируются до первого запроса, когда приложения уже загружены
+from yatube.warmup import warm_up  # noqa: E402
+
+warm_up()
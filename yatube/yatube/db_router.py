@@ -0,0 +1,82 @@
+"""
+Чтение с реплик и запись в основную базу.
+
+Внутри запроса, обернутого ReplicaMiddleware, чтения уходят на одну из
+реплик DATABASE_REPLICAS, выбранную на весь запрос. Чтобы пользователь
+видел свои изменения, запрос с небезопасным методом или запрос, который
+что-то записал (например, подписка через GET), читает из основной базы,
+а ответ ставит cookie, с которой следующие REPLICA_STICKY_SECONDS секунд
+этот пользователь тоже читает из основной базы. Вне запросов (команды,
+фоновые потоки) и внутри транзакций все идет в основную базу.
+"""
+import contextvars
+import random
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+STICKY_COOKIE = 'use_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+# Приложения, которые всегда читаются из основной базы: сессия, созданная
+# при входе, нужна сразу, а не после того, как ее догонит реплика
+PRIMARY_APPS = ('sessions',)
+
+# Реплика текущего запроса; None - читать из основной базы
+_replica = contextvars.ContextVar('replica', default=None)
+
+
+def use_primary():
+    """
+    Переключает остаток текущего запроса на основную базу.
+    """
+    _replica.set(None)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replica = _replica.get()
+        if (replica is None or model._meta.app_label in PRIMARY_APPS
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики - копии основной базы, связи между ними допустимы
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        replicas = list(settings.DATABASE_REPLICAS)
+        sticky = (request.method not in SAFE_METHODS
+                  or STICKY_COOKIE in request.COOKIES)
+        replica = random.choice(replicas) if replicas and not sticky else None
+        wrote = []
+
+        def watch_writes(execute, sql, params, many, context):
+            if sql.lstrip()[:6].upper() != 'SELECT':
+                # После записи запрос дочитывает данные из основной базы
+                wrote.append(True)
+                use_primary()
+            return execute(sql, params, many, context)
+
+        token = _replica.set(replica)
+        try:
+            with connections[DEFAULT_DB_ALIAS].execute_wrapper(watch_writes):
+                response = self.get_response(request)
+        finally:
+            _replica.reset(token)
+        if replicas and (wrote or request.method not in SAFE_METHODS):
+            response.set_cookie(STICKY_COOKIE, '1',
+                                max_age=settings.REPLICA_STICKY_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,301 @@
+"""
+Замеры каждого запроса: SQL, шаблоны, кэш и размер ответа.
+
+MetricsMiddleware собирает для запроса число и время SQL-запросов (через
+connection.execute_wrapper), время отрисовки шаблонов, попадания и
+промахи кэша и размер ответа. Они уходят в заголовок Server-Timing, в
+журнал yatube.metrics одной JSON-строкой и в гистограммы по имени адреса
+(index, profile, post, ...), которые отдает /internal/metrics в текстовом
+формате Prometheus. Гистограммы свои у каждого процесса, как у клиентов
+Prometheus без общего хранилища.
+
+Попадания и промахи считает обертка metered_cache над бэкендом кэша из
+CACHES, поэтому они видны для любого бэкенда. /internal/metrics отдается
+только с заголовком Authorization: Bearer <METRICS_TOKEN>: за обратным
+прокси все запросы приходят с 127.0.0.1, и адрес клиента ничего не
+доказывает. Адрес лежит под префиксом, а не на первом уровне, где он
+занял бы профиль пользователя с именем metrics.
+"""
+import bisect
+import contextvars
+import functools
+import hmac
+import json
+import logging
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpResponse
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as django_backend
+from django.utils.module_loading import import_string
+
+from posts import page_cache
+
+logger = logging.getLogger('yatube.metrics')
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576)
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+# Внутри get_many: BaseCache.get_many вызывает get на каждый ключ
+_in_get_many = contextvars.ContextVar('in_get_many', default=False)
+_MISSING = object()
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.duration = 0
+        self.queries = 0
+        self.sql_time = 0
+        self.template_time = 0
+        self.rendering = False
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def execute(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.sql_time += time.perf_counter() - start
+
+    def server_timing(self):
+        return ', '.join((
+            f'db;desc="{self.queries} queries";'
+            f'dur={self.sql_time * 1000:.1f}',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'cache;desc="{self.cache_hits} hits, '
+            f'{self.cache_misses} misses"',
+            f'total;dur={self.duration * 1000:.1f}',
+        ))
+
+
+def record_cache(hits, misses):
+    """
+    Учитывает обращение к кэшу в замерах текущего запроса, если он есть.
+    """
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.cache_hits += hits
+        metrics.cache_misses += misses
+
+
+class MeteredCacheMixin:
+    """
+    Учитывает попадания и промахи get и get_many в замерах запроса.
+    """
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version)
+        if not _in_get_many.get():
+            record_cache(int(value is not _MISSING), int(value is _MISSING))
+        return default if value is _MISSING else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        token = _in_get_many.set(True)
+        try:
+            found = super().get_many(keys, version)
+        finally:
+            _in_get_many.reset(token)
+        record_cache(len(found), len(keys) - len(found))
+        return found
+
+
+@functools.lru_cache(maxsize=None)
+def _metered_class(backend):
+    cls = import_string(backend)
+    return type(f'Metered{cls.__name__}', (MeteredCacheMixin, cls), {})
+
+
+def metered_cache(location, params):
+    """
+    Бэкенд кэша для CACHES: бэкенд METERED_BACKEND с учетом попаданий.
+    """
+    params = dict(params)
+    return _metered_class(params.pop('METERED_BACKEND'))(location, params)
+
+
+class Histogram:
+    def __init__(self, name, description, buckets):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        # view -> [счетчики по корзинам..., сумма, количество]
+        self.values = {}
+
+    def observe(self, view, value):
+        values = self.values.setdefault(view, [0] * (len(self.buckets) + 3))
+        values[bisect.bisect_left(self.buckets, value)] += 1
+        values[-2] += value
+        values[-1] += 1
+
+    def lines(self):
+        yield f'# HELP {self.name} {self.description}'
+        yield f'# TYPE {self.name} histogram'
+        for view, values in sorted(self.values.items()):
+            total = 0
+            for bucket, count in zip((*self.buckets, '+Inf'), values):
+                total += count
+                labels = f'view="{view}",le="{bucket}"'
+                yield f'{self.name}_bucket{{{labels}}} {total}'
+            yield f'{self.name}_sum{{view="{view}"}} {values[-2]}'
+            yield f'{self.name}_count{{view="{view}"}} {values[-1]}'
+
+
+class Counter:
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+        self.values = {}
+
+    def add(self, view, value):
+        self.values[view] = self.values.get(view, 0) + value
+
+    def lines(self):
+        yield f'# HELP {self.name} {self.description}'
+        yield f'# TYPE {self.name} counter'
+        for view, value in sorted(self.values.items()):
+            yield f'{self.name}{{view="{view}"}} {value}'
+
+
+HISTOGRAMS = {
+    'duration': Histogram('yatube_request_duration_seconds',
+                          'Время ответа.', TIME_BUCKETS),
+    'queries': Histogram('yatube_db_queries',
+                         'SQL-запросов на ответ.', QUERY_BUCKETS),
+    'sql_time': Histogram('yatube_db_duration_seconds',
+                          'Время SQL-запросов ответа.', TIME_BUCKETS),
+    'template_time': Histogram('yatube_template_duration_seconds',
+                               'Время отрисовки шаблонов.', TIME_BUCKETS),
+    'size': Histogram('yatube_response_size_bytes',
+                      'Размер тела ответа.', SIZE_BUCKETS),
+}
+COUNTERS = {
+    'cache_hits': Counter('yatube_cache_hits_total', 'Попаданий в кэш.'),
+    'cache_misses': Counter('yatube_cache_misses_total', 'Промахов кэша.'),
+}
+_lock = threading.Lock()
+
+
+def observe(view, metrics, size):
+    with _lock:
+        for name, histogram in HISTOGRAMS.items():
+            histogram.observe(
+                view, size if name == 'size' else getattr(metrics, name))
+        for name, counter in COUNTERS.items():
+            counter.add(view, getattr(metrics, name))
+
+
+def reset():
+    with _lock:
+        for metric in (*HISTOGRAMS.values(), *COUNTERS.values()):
+            metric.values.clear()
+    page_cache.reset()
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(metrics.execute))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        metrics.duration = time.perf_counter() - metrics.start
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        size = 0 if response.streaming else len(response.content)
+        response['Server-Timing'] = metrics.server_timing()
+        observe(view, metrics, size)
+        self.log(request, response, view, metrics, size)
+        return response
+
+    @staticmethod
+    def log(request, response, view, metrics, size):
+        slow = metrics.duration * 1000 >= settings.METRICS_SLOW_REQUEST_MS
+        level = logging.WARNING if slow else logging.INFO
+        if not logger.isEnabledFor(level):
+            return
+        logger.log(level, json.dumps({
+            'view': view,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(metrics.duration * 1000, 2),
+            'db_queries': metrics.queries,
+            'db_ms': round(metrics.sql_time * 1000, 2),
+            'template_ms': round(metrics.template_time * 1000, 2),
+            'cache_hits': metrics.cache_hits,
+            'cache_misses': metrics.cache_misses,
+            'size': size,
+        }, ensure_ascii=False))
+
+
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        # Вложенные отрисовки (карточки внутри ленты) уже входят во
+        # время внешней
+        metrics = _current.get()
+        if metrics is None or metrics.rendering:
+            return super().render(context, request)
+        metrics.rendering = True
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.rendering = False
+            metrics.template_time += time.perf_counter() - start
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """
+    Шаблонизатор Django, который замеряет время отрисовки шаблонов.
+    """
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
+
+
+def metrics_view(request):
+    """
+    Гистограммы и счетчики процесса в текстовом формате Prometheus.
+    """
+    token = settings.METRICS_TOKEN
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    if not token or not hmac.compare_digest(
+            authorization.encode(), f'Bearer {token}'.encode()):
+        raise Http404
+    with _lock:
+        lines = [line for metric in (*HISTOGRAMS.values(),
+                                     *COUNTERS.values())
+                 for line in metric.lines()]
+    stats = page_cache.stats()
+    for name in ('hits', 'misses'):
+        lines += [
+            f'# HELP yatube_page_cache_{name}_total Кэш страниц: {name}.',
+            f'# TYPE yatube_page_cache_{name}_total counter',
+            f'yatube_page_cache_{name}_total {stats[name]}',
+        ]
+    return HttpResponse('\n'.join(lines) + '\n',
+                        content_type='text/plain; version=0.0.4')
@@ -0,0 +1,18 @@
+"""
+Плагин pytest с проверкой на N+1.
+
+Подключается через pytest_plugins и дает фикстуру
+no_repeated_queries::
+
+    def test_index(client, no_repeated_queries):
+        with no_repeated_queries():
+            client.get('/')
+"""
+import pytest
+
+from .queries import assert_no_repeated_queries
+
+
+@pytest.fixture
+def no_repeated_queries():
+    return assert_no_repeated_queries
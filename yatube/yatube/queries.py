@@ -0,0 +1,165 @@
+"""
+Поиск N+1 и журнал медленных SQL-запросов для разработки и CI.
+
+Запросы внутри запроса страницы (или блока capture) группируются по
+форме: текст SQL без литералов и с IN-списком любой длины. Если одна
+форма SELECT повторяется QUERY_REPEAT_THRESHOLD раз и больше, это
+признак N+1, и в отчет попадают места, откуда запросы пришли: строка
+шаблона, если запрос выполнен при отрисовке, иначе строка кода проекта.
+Запросы дольше SLOW_QUERY_MS пишутся в журнал вместе с EXPLAIN.
+
+Разбор стека на каждый запрос не бесплатен, поэтому
+QueryInspectorMiddleware включается только настройкой QUERY_INSPECTOR.
+"""
+import logging
+import os
+import re
+import sys
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('yatube.queries')
+
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_NUMBERS = re.compile(r'\b\d+(?:\.\d+)?\b')
+_LISTS = re.compile(r'\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)')
+_SPACES = re.compile(r'\s+')
+
+
+def normalize(sql):
+    """
+    Форма запроса: литералы заменены на ?, списки параметров - на (...).
+    """
+    sql = _STRINGS.sub('?', sql)
+    sql = _NUMBERS.sub('?', sql)
+    sql = _LISTS.sub('(...)', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+def location():
+    """
+    Откуда выполняется запрос: шаблон и строка, если он идет из
+    отрисовки шаблона, иначе файл и строка кода проекта.
+    """
+    frame = sys._getframe(1)
+    code_site = None
+    while frame is not None:
+        code = frame.f_code
+        if code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            origin = getattr(node, 'origin', None)
+            token = getattr(node, 'token', None)
+            if origin is not None and token is not None:
+                name = origin.template_name or origin.name
+                return f'{name}:{token.lineno}'
+        filename = code.co_filename
+        if (code_site is None and filename.startswith(settings.BASE_DIR)
+                and 'site-packages' not in filename
+                and filename != __file__):
+            path = os.path.relpath(filename, settings.BASE_DIR)
+            code_site = f'{path}:{frame.f_lineno}'
+        frame = frame.f_back
+    return code_site or 'unknown'
+
+
+def explain(connection, sql, params):
+    # Выполняется на курсоре драйвера, мимо execute_wrapper
+    prefix = connection.ops.explain_query_prefix()
+    with connection.cursor() as cursor:
+        cursor.cursor.execute(f'{prefix} {sql}', params)
+        return '\n'.join(' '.join(str(value) for value in row)
+                         for row in cursor.cursor.fetchall())
+
+
+class QueryLog:
+    def __init__(self, slow_ms=None):
+        self.slow_ms = slow_ms
+        # (форма, место) для каждого SELECT
+        self.selects = []
+
+    def execute(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = (time.perf_counter() - start) * 1000
+            is_select = sql.lstrip().upper().startswith('SELECT')
+            if is_select:
+                self.selects.append((normalize(sql), location()))
+            if self.slow_ms is not None and duration >= self.slow_ms:
+                self.log_slow(context['connection'], sql, params, many,
+                              duration, is_select)
+
+    @staticmethod
+    def log_slow(connection, sql, params, many, duration, is_select):
+        plan = ''
+        if is_select and not many:
+            plan = explain(connection, sql, params)
+        logger.warning('Медленный запрос, %.1f мс: %s; параметры: %r\n%s',
+                       duration, sql, params, plan)
+
+    def repeated(self, threshold):
+        """
+        Формы SELECT, выполненные threshold раз и больше, с числом
+        повторов и местами, откуда они пришли.
+        """
+        shapes = Counter(shape for shape, _ in self.selects)
+        return [
+            (shape, count, Counter(where for other, where in self.selects
+                                   if other == shape))
+            for shape, count in shapes.most_common() if count >= threshold
+        ]
+
+    def report(self, threshold):
+        lines = []
+        for shape, count, places in self.repeated(threshold):
+            lines.append(f'{count} раз: {shape}')
+            lines += [f'    {where} ({times})'
+                      for where, times in places.most_common()]
+        return '\n'.join(lines)
+
+
+@contextmanager
+def capture(slow_ms=None):
+    """
+    Записывает запросы ко всем базам внутри блока в QueryLog.
+    """
+    log = QueryLog(slow_ms)
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(log.execute))
+        yield log
+
+
+@contextmanager
+def assert_no_repeated_queries(threshold=None):
+    """
+    Падает с AssertionError, если внутри блока есть N+1.
+    """
+    threshold = threshold or settings.QUERY_REPEAT_THRESHOLD
+    with capture() as log:
+        yield log
+    report = log.report(threshold)
+    if report:
+        raise AssertionError(f'Повторяющиеся запросы:\n{report}')
+
+
+class QueryInspectorMiddleware:
+    def __init__(self, get_response):
+        if not settings.QUERY_INSPECTOR:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with capture(settings.SLOW_QUERY_MS) as log:
+            response = self.get_response(request)
+        report = log.report(settings.QUERY_REPEAT_THRESHOLD)
+        if report:
+            logger.warning('N+1 в %s %s:\n%s', request.method,
+                           request.get_full_path(), report)
+        return response
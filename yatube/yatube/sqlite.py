@@ -0,0 +1,44 @@
+"""
+Настройка соединений SQLite для работы под нагрузкой.
+
+Каждое новое соединение получает PRAGMA из SQLITE_PRAGMAS: WAL, при
+котором читатели не ждут писателя, ожидание занятой базы вместо
+немедленного "database is locked", synchronous=NORMAL (в режиме WAL
+надежно при падении процесса), больший кэш страниц, mmap и временные
+таблицы в памяти. Соединения переиспользуются благодаря CONN_MAX_AGE.
+
+SQLite допускает одного писателя, и две транзакции, которые начали с
+чтения, а потом пишут, могут получить "database is locked" без всякого
+ожидания. serialize_writes выстраивает пишущие представления процесса
+в очередь на одной блокировке, если включен SQLITE_SERIALIZE_WRITES.
+"""
+import functools
+import threading
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+_write_lock = threading.Lock()
+
+
+@receiver(connection_created)
+def apply_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    # Напрямую через драйвер, чтобы не попасть в замеры запроса
+    for name, value in settings.SQLITE_PRAGMAS.items():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
+
+
+def serialize_writes(view):
+    """
+    Выполняет представление под общей для процесса блокировкой записи.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not settings.SQLITE_SERIALIZE_WRITES:
+            return view(request, *args, **kwargs)
+        with _write_lock:
+            return view(request, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,39 @@
+"""
+Тесты работают со своим файлом кэша.
+
+Файл кэша по умолчанию лежит в каталоге проекта и общий с сервером
+разработки, а тесты его очищают. На время тестов CACHES указывает на
+файл во временном каталоге, который потом удаляется.
+"""
+import copy
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+@contextmanager
+def temporary_cache():
+    directory = tempfile.mkdtemp()
+    caches = copy.deepcopy(settings.CACHES)
+    if caches['default'].get('METERED_BACKEND') == 'yatube.cache.SQLiteCache':
+        caches['default']['LOCATION'] = f'{directory}/cache.sqlite3'
+    try:
+        with override_settings(CACHES=caches):
+            yield
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache = temporary_cache()
+        self.cache.__enter__()
+
+    def teardown_test_environment(self, **kwargs):
+        self.cache.__exit__(None, None, None)
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,32 @@
+import asyncio
+
+from django.test import SimpleTestCase
+
+from ..asgi import application
+
+
+class AsgiApplicationTests(SimpleTestCase):
+    def request(self, path):
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {
+            'type': 'http', 'http_version': '1.1', 'method': 'GET',
+            'path': path,
+            'query_string': b'', 'root_path': '', 'scheme': 'http',
+            'headers': [(b'host', b'localhost')],
+            'server': ('localhost', 80),
+        }
+        asyncio.run(application(scope, receive, send))
+        return messages
+
+    def test_page_is_served(self):
+        """ASGI-приложение отдает страницу проекта."""
+        start, body = self.request('/about/author/')[:2]
+        self.assertEqual(start['status'], 200)
+        self.assertIn('Об авторе'.encode(), body['body'])
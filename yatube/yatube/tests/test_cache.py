@@ -0,0 +1,81 @@
+import shutil
+import tempfile
+import threading
+import time
+
+from django.test import SimpleTestCase
+
+from ..cache import SQLiteCache, get_or_compute
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = f'{self.directory}/cache.sqlite3'
+        self.cache = SQLiteCache(self.location, {})
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_values_are_shared_between_instances(self):
+        """Значение, записанное одним процессом, видно другому."""
+        self.cache.set('key', {'value': [1, 2]})
+        other = SQLiteCache(self.location, {})
+        self.assertEqual(other.get('key'), {'value': [1, 2]})
+        self.assertEqual(other.get_many(['key', 'missing']),
+                         {'key': {'value': [1, 2]}})
+
+    def test_expired_values_are_not_returned(self):
+        """Просроченное значение не возвращается, а add его заменяет."""
+        self.cache.set('key', 'old', timeout=0)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 'new'))
+        self.assertFalse(self.cache.add('key', 'newer'))
+        self.assertEqual(self.cache.get('key'), 'new')
+
+    def test_incr_and_delete(self):
+        """incr увеличивает число, delete удаляет ключ."""
+        self.cache.set('counter', 1)
+        self.assertEqual(self.cache.incr('counter', 2), 3)
+        self.cache.delete('counter')
+        self.assertFalse(self.cache.has_key('counter'))
+        with self.assertRaises(ValueError):
+            self.cache.incr('counter')
+
+
+class GetOrComputeTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = SQLiteCache(f'{self.directory}/cache.sqlite3', {})
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_concurrent_misses_compute_once(self):
+        """При пустом кэше значение считает только один поток."""
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'value'
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(
+                get_or_compute('key', compute, 60, cache=self.cache)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['value'] * 5)
+
+    def test_stale_value_is_recomputed(self):
+        """Значение с истекшим логическим сроком пересчитывается."""
+        self.cache.set('key', ('old', 0.1, time.time() - 1), 60)
+        self.assertEqual(
+            get_or_compute('key', lambda: 'new', 60, cache=self.cache), 'new')
+        self.assertEqual(self.cache.get('key')[0], 'new')
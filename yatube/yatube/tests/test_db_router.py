@@ -0,0 +1,67 @@
+from django.contrib.sessions.models import Session
+from django.db import router
+from django.http import HttpResponse
+from django.test import (RequestFactory, TransactionTestCase,
+                         override_settings)
+
+from posts.models import Post
+
+from ..db_router import STICKY_COOKIE, ReplicaMiddleware
+
+
+@override_settings(DATABASE_REPLICAS={'replica': {}},
+                   REPLICA_STICKY_SECONDS=10)
+class ReplicaRouterTests(TransactionTestCase):
+    # Без транзакции TestCase: внутри нее все читается из основной базы
+    def request(self, request, view=None):
+        routed = []
+
+        def get_response(request):
+            if view is not None:
+                view()
+            routed.append(router.db_for_read(Post))
+            return HttpResponse()
+        response = ReplicaMiddleware(get_response)(request)
+        return routed[0], response
+
+    def test_reads_go_to_replica(self):
+        """Чтение в GET-запросе идет на реплику и не ставит cookie."""
+        database, response = self.request(RequestFactory().get('/'))
+        self.assertEqual(database, 'replica')
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_unsafe_request_reads_primary_and_sticks(self):
+        """POST читает из основной базы и ставит cookie на время."""
+        database, response = self.request(RequestFactory().post('/'))
+        self.assertEqual(database, 'default')
+        self.assertEqual(response.cookies[STICKY_COOKIE]['max-age'], 10)
+
+    def test_sticky_cookie_reads_primary(self):
+        """С cookie после записи чтение идет из основной базы."""
+        request = RequestFactory().get('/')
+        request.COOKIES[STICKY_COOKIE] = '1'
+        self.assertEqual(self.request(request)[0], 'default')
+
+    def test_write_in_get_request_switches_to_primary(self):
+        """Запись в GET-запросе (подписка) переводит чтение на основную
+        базу."""
+        database, response = self.request(
+            RequestFactory().get('/'),
+            lambda: Post.objects.filter(pk=0).update(text=''))
+        self.assertEqual(database, 'default')
+        self.assertIn(STICKY_COOKIE, response.cookies)
+
+    def test_sessions_are_read_from_primary(self):
+        """Сессии всегда читаются из основной базы."""
+        routed = []
+
+        def get_response(request):
+            routed.append(router.db_for_read(Session))
+            return HttpResponse()
+        ReplicaMiddleware(get_response)(RequestFactory().get('/'))
+        self.assertEqual(routed, ['default'])
+
+    def test_outside_request_reads_primary(self):
+        """Вне запроса (команды, фоновые потоки) чтение из основной
+        базы."""
+        self.assertEqual(router.db_for_read(Post), 'default')
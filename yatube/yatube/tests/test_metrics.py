@@ -0,0 +1,99 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+
+from .. import metrics
+
+User = get_user_model()
+
+
+@override_settings(POSTS_PAGE_CACHE_TIMEOUT=0, METRICS_TOKEN='secret')
+class MetricsMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(username='author')
+        Post.objects.create(text='Запись', author=author)
+
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+
+    def test_server_timing_header(self):
+        """Ответ несет число SQL-запросов, время шаблонов и кэша."""
+        response = self.client.get('/author/')
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'db;desc="\d+ queries";dur=[\d.]+')
+        self.assertRegex(timing, r'tpl;dur=[\d.]+')
+        self.assertRegex(timing, r'cache;desc="\d+ hits, \d+ misses"')
+        self.assertNotIn('db;desc="0 queries"', timing)
+
+    def test_metrics_endpoint_exposes_histograms_by_view(self):
+        """/internal/metrics отдает гистограммы по имени адреса в формате
+        Prometheus."""
+        self.client.get('/')
+        self.client.get('/')
+        body = self.client.get(
+            reverse('metrics'),
+            HTTP_AUTHORIZATION='Bearer secret').content.decode()
+        self.assertIn(
+            'yatube_request_duration_seconds_count{view="index"} 2', body)
+        self.assertIn(
+            'yatube_db_queries_bucket{view="index",le="+Inf"} 2', body)
+        self.assertIn('# TYPE yatube_response_size_bytes histogram', body)
+        self.assertIn('yatube_page_cache_hits_total 0', body)
+
+    def test_metrics_endpoint_requires_token(self):
+        """Без верного токена /internal/metrics недоступен, в том числе с
+        локального адреса за обратным прокси."""
+        for authorization in ('', 'Bearer wrong', 'secret'):
+            with self.subTest(authorization=authorization):
+                response = self.client.get(
+                    reverse('metrics'), HTTP_AUTHORIZATION=authorization)
+                self.assertEqual(response.status_code, 404)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_metrics_endpoint_is_closed_without_configured_token(self):
+        """Без METRICS_TOKEN в настройках /internal/metrics закрыт."""
+        response = self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer ')
+        self.assertEqual(response.status_code, 404)
+
+    def test_metrics_endpoint_keeps_profile_url_free(self):
+        """Адрес метрик не занимает профиль пользователя metrics."""
+        User.objects.create(username='metrics')
+        response = self.client.get(
+            reverse('profile', args=['metrics']),
+            HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['author'].username, 'metrics')
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'yatube.metrics.metered_cache',
+        'METERED_BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }})
+    def test_cache_hits_are_counted_for_any_backend(self):
+        """Попадания и промахи считаются и для бэкендов, кроме
+        SQLiteCache."""
+        backend = caches['default']
+        backend.set('a', 1)
+        request_metrics = metrics.RequestMetrics()
+        token = metrics._current.set(request_metrics)
+        try:
+            self.assertEqual(backend.get('a'), 1)
+            self.assertIsNone(backend.get('b'))
+            self.assertEqual(backend.get_many(['a', 'b', 'c']), {'a': 1})
+        finally:
+            metrics._current.reset(token)
+        self.assertEqual(request_metrics.cache_hits, 2)
+        self.assertEqual(request_metrics.cache_misses, 3)
+
+    @override_settings(METRICS_SLOW_REQUEST_MS=0)
+    def test_slow_request_is_logged(self):
+        """Медленный запрос пишется в журнал строкой JSON."""
+        with self.assertLogs('yatube.metrics', 'WARNING') as logs:
+            self.client.get('/author/')
+        self.assertIn('"view": "profile"', logs.output[0])
+        self.assertIn('"status": 200', logs.output[0])
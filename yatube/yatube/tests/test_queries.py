@@ -0,0 +1,49 @@
+from django.contrib.auth import get_user_model
+from django.template import engines
+from django.test import TestCase
+
+from posts.models import Post
+
+from ..queries import assert_no_repeated_queries, capture, normalize
+
+User = get_user_model()
+
+
+class QueryInspectorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for number in range(6):
+            author = User.objects.create(username=f'author{number}')
+            Post.objects.create(text='Запись', author=author)
+
+    def test_shapes_ignore_literals_and_list_length(self):
+        """Запросы с разными литералами и длиной IN-списка имеют одну
+        форму."""
+        self.assertEqual(
+            normalize("SELECT * FROM t WHERE id IN (%s, %s) AND x = 'a'"),
+            normalize('SELECT *  FROM t WHERE id IN (%s) AND x = 15'))
+
+    def test_repeats_are_attributed_to_template_line(self):
+        """Запрос на каждую строку отмечается строкой шаблона."""
+        template = engines['django'].from_string(
+            '{% for post in posts %}\n{{ post.author.username }}\n'
+            '{% endfor %}')
+        posts = list(Post.objects.all())
+        with self.assertRaises(AssertionError) as error:
+            with assert_no_repeated_queries(threshold=5):
+                template.render({'posts': posts})
+        self.assertIn('6 раз: SELECT', str(error.exception))
+        self.assertIn('<unknown source>:2 (6)', str(error.exception))
+
+    def test_single_query_feed_passes(self):
+        """Лента с select_related не считается N+1."""
+        with assert_no_repeated_queries(threshold=2):
+            [post.author.username for post in Post.objects.for_feed()]
+
+    def test_slow_query_is_logged_with_plan(self):
+        """Медленный запрос пишется в журнал вместе с EXPLAIN."""
+        with self.assertLogs('yatube.queries', 'WARNING') as logs:
+            with capture(slow_ms=0):
+                Post.objects.filter(author__username='author1').count()
+        self.assertIn('Медленный запрос', logs.output[0])
+        self.assertIn('SEARCH', logs.output[0])
@@ -0,0 +1,31 @@
+from django.db import connection
+from django.http import HttpResponse
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from .. import sqlite
+
+
+class SQLitePragmasTests(TestCase):
+    def test_pragmas_are_applied_to_new_connections(self):
+        """Новое соединение получает PRAGMA из настроек."""
+        with connection.cursor() as cursor:
+            for name, expected in (('busy_timeout', 5000),
+                                   ('synchronous', 1), ('temp_store', 2)):
+                with self.subTest(pragma=name):
+                    cursor.execute(f'PRAGMA {name}')
+                    self.assertEqual(cursor.fetchone()[0], expected)
+
+
+class SerializeWritesTests(SimpleTestCase):
+    def view(self, request):
+        return HttpResponse(str(sqlite._write_lock.locked()))
+
+    def test_view_runs_under_lock_when_enabled(self):
+        """С SQLITE_SERIALIZE_WRITES представление выполняется под
+        блокировкой записи, без него - нет."""
+        view = sqlite.serialize_writes(self.view)
+        for enabled in (True, False):
+            with self.subTest(enabled=enabled):
+                with override_settings(SQLITE_SERIALIZE_WRITES=enabled):
+                    self.assertEqual(view(None).content,
+                                     str(enabled).encode())
@@ -0,0 +1,31 @@
+import copy
+
+from django.conf import settings
+from django.template import engines
+from django.test import SimpleTestCase, override_settings
+
+from .. import warmup
+
+
+def templates(loaders):
+    templates = copy.deepcopy(settings.TEMPLATES)
+    templates[0]['OPTIONS']['loaders'] = loaders
+    return templates
+
+
+class WarmUpTests(SimpleTestCase):
+    @override_settings(TEMPLATES=templates([(
+        'django.template.loaders.cached.Loader', settings.TEMPLATE_LOADERS)]))
+    def test_templates_are_compiled_into_loader_cache(self):
+        """Прогрев компилирует все шаблоны приложений в кэш загрузчика."""
+        names = list(warmup.template_names(settings.TEMPLATES_WARM_UP_APPS))
+        self.assertIn('posts/index.html', names)
+        self.assertIn('registration/login.html', names)
+        self.assertEqual(warmup.warm_up(), len(names))
+        loader = engines['django'].engine.template_loaders[0]
+        self.assertIn('posts/index.html', loader.get_template_cache)
+
+    @override_settings(TEMPLATES=templates(settings.TEMPLATE_LOADERS))
+    def test_nothing_to_warm_up_without_cached_loader(self):
+        """Без кэширующего загрузчика прогрев ничего не делает."""
+        self.assertEqual(warmup.warm_up(), 0)
@@ -4,9 +4,12 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from .metrics import metrics_view
+
 urlpatterns = [
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
+    path('internal/metrics', metrics_view, name='metrics'),
     path('', include('posts.urls')),
     path('admin/admin/', admin.site.urls),
     path('about/', include('about.urls', namespace='about')),
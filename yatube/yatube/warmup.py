@@ -0,0 +1,48 @@
+"""
+Компиляция шаблонов при запуске рабочего процесса.
+
+Кэширующий загрузчик разбирает шаблон при первом обращении, и без
+прогрева эту работу делают первые запросы каждого процесса. warm_up
+заранее загружает все шаблоны приложений TEMPLATES_WARM_UP_APPS, а
+заодно пишет в журнал синтаксические ошибки шаблонов, не дожидаясь
+запроса, который на них упадет.
+"""
+import logging
+import os
+
+from django.apps import apps
+from django.conf import settings
+from django.template import TemplateSyntaxError, engines
+from django.template.loaders.cached import Loader as CachedLoader
+
+logger = logging.getLogger('yatube.warmup')
+
+
+def template_names(app_labels):
+    for label in app_labels:
+        directory = os.path.join(apps.get_app_config(label).path,
+                                 'templates')
+        for root, _, files in os.walk(directory):
+            for name in sorted(files):
+                path = os.path.relpath(os.path.join(root, name), directory)
+                yield path.replace(os.sep, '/')
+
+
+def warm_up():
+    """
+    Загружает шаблоны в кэш загрузчика и возвращает число загруженных; без
+    кэширующего загрузчика (при отладке) ничего не делает.
+    """
+    engine = engines['django'].engine
+    if not any(isinstance(loader, CachedLoader)
+               for loader in engine.template_loaders):
+        return 0
+    loaded = 0
+    for name in template_names(settings.TEMPLATES_WARM_UP_APPS):
+        try:
+            engine.get_template(name)
+        except TemplateSyntaxError:
+            logger.exception('Ошибка в шаблоне %s', name)
+        else:
+            loaded += 1
+    return loaded